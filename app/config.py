@@ -33,6 +33,8 @@ class Settings(BaseModel):
     notebooklm_location: str = "global"
     notebooklm_endpoint_location: str = "global"
     notebooklm_notebook_id: Optional[str] = None
+    redis_url: Optional[str] = None
+    semantic_cache_enabled: bool = False
 
 
 @lru_cache
@@ -65,6 +67,9 @@ def get_settings() -> Settings:
             notebooklm_location=os.getenv("NOTEBOOKLM_LOCATION", "global"),
             notebooklm_endpoint_location=os.getenv("NOTEBOOKLM_ENDPOINT_LOCATION", "global"),
             notebooklm_notebook_id=_optional_env("NOTEBOOKLM_NOTEBOOK_ID", credentials),
+            redis_url=_optional_env("REDIS_URL", credentials),
+            semantic_cache_enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "").lower()
+            in ("1", "true", "yes"),
         )
     except (ValidationError, KeyError) as exc:
         missing = ", ".join(sorted(_missing_keys()))
@@ -5,11 +5,13 @@ FastAPI application entry point for the WhatsApp bot.
 from __future__ import annotations
 
 import logging
+import time
 from contextlib import asynccontextmanager
 
+import aiojobs
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from app.config import get_settings
 from app.constants import VERSION, APP_NAME, DEFAULT_BOT_DISPLAY_NAME
@@ -22,10 +24,28 @@ from app.services.intent_engine import IntentEngine
 from app.services.supabase_client import SupabaseService
 from app.services.container_status import ContainerStatusService
 from app.services.manager_gpt_service import ManagerGPTService
+from app.services.notebooklm_client import NotebookLMClient
+from app.services.query_log import QueryLogWriter
+from app.services.response_cache import ResponseCache
+from app.services.semantic_cache import SemanticCache
 
 logging.basicConfig(level=logging.INFO)
+# httpx logs every request URL at INFO; Green API URLs carry the API token
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Incoming messages are answered as scheduler jobs after the webhook returns
+# 202; each job queues its reply (send + query log) as a job on a second
+# scheduler. Separate schedulers, so a full send queue can never block the
+# message jobs that feed it. Both are bounded so a burst of webhooks cannot
+# pile up unlimited tasks.
+MESSAGE_JOBS_LIMIT = 50
+MESSAGE_JOBS_PENDING_LIMIT = 1000
+MESSAGE_JOBS_DRAIN_TIMEOUT_SECONDS = 60
+SEND_JOBS_LIMIT = 100
+SEND_JOBS_PENDING_LIMIT = 500
+SEND_JOBS_DRAIN_TIMEOUT_SECONDS = 30
+
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
@@ -36,6 +56,7 @@ async def lifespan(application: FastAPI):
     logger.info("Initializing services with Green API instance %s", settings.green_api_instance_id)
 
     application.state.intent_engine = IntentEngine()
+    webhook.clear_intent_cache()
     application.state.supabase_service = SupabaseService(
         supabase_url=settings.supabase_url,
         supabase_key=settings.supabase_service_role_key,
@@ -48,13 +69,38 @@ async def lifespan(application: FastAPI):
     application.state.green_webhook_token = settings.green_api_webhook_token
     application.state.hazard_knowledge = HazardKnowledgeBase()
     application.state.topic_knowledge = TopicKnowledgeBase()
-    application.state.container_status_service = ContainerStatusService()
+    webhook.clear_knowledge_cache()
+    application.state.container_status_service = ContainerStatusService(
+        redis_url=settings.redis_url
+    )
+    application.state.container_status_service.start()
+    application.state.response_cache = ResponseCache(redis_url=settings.redis_url)
+    application.state.query_log = QueryLogWriter(application.state.supabase_service)
+    application.state.query_log.start()
+    application.state.scheduler = aiojobs.Scheduler(
+        limit=SEND_JOBS_LIMIT,
+        pending_limit=SEND_JOBS_PENDING_LIMIT,
+    )
+    application.state.message_scheduler = aiojobs.Scheduler(
+        limit=MESSAGE_JOBS_LIMIT,
+        pending_limit=MESSAGE_JOBS_PENDING_LIMIT,
+    )
     if settings.gemini_api_key:
         application.state.gemini_service = GeminiService(
             api_key=settings.gemini_api_key,
         )
     else:
         application.state.gemini_service = None
+
+    # Needs sql/create_llm_cache_table.sql and Gemini for embeddings
+    if settings.semantic_cache_enabled and application.state.gemini_service is not None:
+        application.state.semantic_cache = SemanticCache(
+            application.state.supabase_service,
+            application.state.gemini_service,
+        )
+        logger.info("Semantic LLM answer cache enabled")
+    else:
+        application.state.semantic_cache = None
     
     # Disable Council Service (OpenRouter-based multi-model) to avoid 404/402 errors
     # All non-intent questions will use Gemini (if configured) or a simple fallback.
@@ -75,32 +121,73 @@ async def lifespan(application: FastAPI):
         application.state.manager_gpt_service = None
         logger.info("Manager GPT service not available (GEMINI_API_KEY not set)")
 
+    # One client (and connection pool) for the web chat's NotebookLM fallback.
+    # The Gemini API key doubles as the NotebookLM Enterprise credential.
+    application.state.notebooklm_client = NotebookLMClient(
+        api_key=settings.gemini_api_key,
+        project_number=settings.google_cloud_project_number,
+        location=settings.notebooklm_location,
+        endpoint_location=settings.notebooklm_endpoint_location,
+        notebook_id=settings.notebooklm_notebook_id,
+    )
+
+    webhook.init_router(application)
+    chat.init_router(application)
+
     try:
         yield
     finally:
+        logger.info("Draining pending incoming and outgoing messages")
+        await application.state.message_scheduler.wait_and_close(
+            timeout=MESSAGE_JOBS_DRAIN_TIMEOUT_SECONDS
+        )
+        await application.state.scheduler.wait_and_close(
+            timeout=SEND_JOBS_DRAIN_TIMEOUT_SECONDS
+        )
+        await application.state.query_log.close()
+        webhook.log_intent_cache_stats()
         logger.info("Shutting down Green API client")
         await application.state.green_api_client.close()
+        await application.state.response_cache.close()
+        await application.state.container_status_service.close()
+        if application.state.council_service is not None:
+            await application.state.council_service.close()
+        await application.state.notebooklm_client.close()
+        application.state.supabase_service.close()
 
 
 app = FastAPI(
     title=APP_NAME,
     version=VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests for debugging."""
-    logger.info("Incoming request: %s %s from %s", request.method, request.url.path, request.client.host if request.client else "unknown")
-    
-    # Log headers for webhook endpoints to help debug
-    if request.url.path.startswith("/api/green/webhook"):
-        logger.info("Webhook headers: %s", dict(request.headers))
-    
+    """Log one line per request (method, path, status, duration)."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Incoming request: %s %s from %s",
+            request.method,
+            request.url.path,
+            request.client.host if request.client else "unknown",
+        )
+        # Log headers for webhook endpoints to help debug
+        if request.url.path.startswith("/api/green/webhook"):
+            logger.debug("Webhook headers: %s", dict(request.headers))
+
+    started = time.perf_counter()
     try:
         response = await call_next(request)
-        logger.info("Response status: %s for %s %s", response.status_code, request.method, request.url.path)
+        logger.info(
+            "%s %s -> %s (%.1f ms)",
+            request.method,
+            request.url.path,
+            response.status_code,
+            (time.perf_counter() - started) * 1000,
+        )
         return response
     except Exception as e:
         logger.error("Error processing request %s %s: %s", request.method, request.url.path, e, exc_info=True)
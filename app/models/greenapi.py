@@ -10,7 +10,7 @@ from pydantic import BaseModel, ConfigDict
 class MessageTextData(BaseModel):
     """Text message information nested within `messageData`."""
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
     textMessage: str | None = None
 
@@ -18,7 +18,7 @@ class MessageTextData(BaseModel):
 class MessageData(BaseModel):
     """Subset of message data relevant for text-based automations."""
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
     typeMessage: str
     textMessageData: MessageTextData | None = None
@@ -27,7 +27,7 @@ class MessageData(BaseModel):
 class SenderData(BaseModel):
     """Metadata about the sender of an incoming message."""
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
     chatId: str
     sender: str | None = None
@@ -38,11 +38,12 @@ class GreenWebhookPayload(BaseModel):
     """
     Root payload for webhook notifications from Green API.
 
-    The API exposes a broad schema; we extract the fields required for the bot flow.
+    The API exposes a broad schema; we extract the fields required for the bot flow
+    and ignore the rest, so unknown keys are neither validated nor stored.
     Note: messageData and senderData are only present for incomingMessageReceived webhooks.
     """
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="ignore")
 
     typeWebhook: str
     timestamp: int | None = None
@@ -4,17 +4,22 @@ Web chat interface for querying the bot.
 
 from __future__ import annotations
 
+import asyncio
+import dataclasses
 import json
 import logging
+import time
 import datetime as dt
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Mapping
+
 from fastapi import (
     APIRouter,
     Depends,
-    HTTPException,
-    status,
+    FastAPI,
 )
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.constants import (
     MAX_CONVERSATION_HISTORY,
@@ -22,7 +27,7 @@ from app.constants import (
     DEFAULT_MAX_ROWS_FOR_LLM,
     VERSION,
 )
-from app.services.intent_engine import IntentEngine, IntentResult
+from app.services.intent_engine import NO_PARAMETERS, IntentEngine, IntentResult
 from app.services.response_builder import (
     build_containers_range_response,
     build_daily_containers_response,
@@ -40,16 +45,33 @@ from app.services.topic_knowledge import TopicKnowledgeBase
 from app.services.container_status import ContainerStatusService
 from app.services.manager_gpt_service import ManagerGPTService
 from app.services.notebooklm_client import NotebookLMClient
+from app.services.query_log import QueryLogWriter
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/chat", tags=["chat"])
+router = APIRouter(prefix="/api/chat", tags=["chat"], default_response_class=ORJSONResponse)
+
+# Anonymous web users share one id (and therefore one precomputed chat id)
+ANON_USER_ID = "web_user"
+ANON_CHAT_ID = f"{ANON_USER_ID}@web"
+
+NOTEBOOKLM_NOTEBOOK_URL = "https://notebooklm.google.com/notebook/66688b34-ca77-4097-8ac8-42ca8285681f"
+
+# Phrases in a Gemini answer that trigger the NotebookLM fallback
+NOTEBOOKLM_FALLBACK_INDICATORS = ("אין מידע", "לא זמין", "לא ניתן לספק", "אינם כוללים")
+
+# The default LLM metrics window only moves once a day, so the summary fetched
+# for it is cached and shared by the no-intent and llm_analysis branches.
+METRICS_CACHE_TTL_SECONDS = 60 * 60  # 1 hour
+_metrics_cache: dict[tuple[dt.date, dt.date, int], tuple[float, Mapping[str, Any]]] = {}
 
 
 class ChatRequest(BaseModel):
     """Request model for chat queries."""
-    question: str
-    user_id: str | None = None  # Optional user ID for conversation history
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True, frozen=True)
+
+    question: str = Field(..., min_length=1, max_length=4000)
+    user_id: str = ANON_USER_ID  # Set by clients that want conversation history
 
 
 class Citation(BaseModel):
@@ -83,64 +105,111 @@ class RecentQueriesResponse(BaseModel):
     queries: list[RecentQuery]
 
 
+# Service singletons, bound once at startup by init_router() so the
+# dependency getters below are plain global reads.
+_INTENT_ENGINE: IntentEngine | None = None
+_SUPABASE_SERVICE: SupabaseService | None = None
+_GEMINI_SERVICE: GeminiService | None = None
+_COUNCIL_SERVICE: CouncilService | None = None
+_HAZARD_KNOWLEDGE: HazardKnowledgeBase | None = None
+_TOPIC_KNOWLEDGE: TopicKnowledgeBase | None = None
+_CONTAINER_STATUS_SERVICE: ContainerStatusService | None = None
+_MANAGER_GPT_SERVICE: ManagerGPTService | None = None
+_QUERY_LOG: QueryLogWriter | None = None
+_NOTEBOOKLM_CLIENT: NotebookLMClient | None = None
+
+
+def init_router(app: FastAPI) -> None:
+    """Bind the services created in the app lifespan to this router."""
+    global _INTENT_ENGINE, _SUPABASE_SERVICE, _GEMINI_SERVICE, _COUNCIL_SERVICE
+    global _HAZARD_KNOWLEDGE, _TOPIC_KNOWLEDGE, _CONTAINER_STATUS_SERVICE, _MANAGER_GPT_SERVICE
+    global _QUERY_LOG, _NOTEBOOKLM_CLIENT
+
+    state = app.state
+    _INTENT_ENGINE = getattr(state, "intent_engine", None)
+    _SUPABASE_SERVICE = getattr(state, "supabase_service", None)
+    _GEMINI_SERVICE = getattr(state, "gemini_service", None)
+    _COUNCIL_SERVICE = getattr(state, "council_service", None)
+    _HAZARD_KNOWLEDGE = getattr(state, "hazard_knowledge", None)
+    _TOPIC_KNOWLEDGE = getattr(state, "topic_knowledge", None)
+    _CONTAINER_STATUS_SERVICE = getattr(state, "container_status_service", None)
+    _MANAGER_GPT_SERVICE = getattr(state, "manager_gpt_service", None)
+    _QUERY_LOG = getattr(state, "query_log", None)
+    _NOTEBOOKLM_CLIENT = getattr(state, "notebooklm_client", None)
+
+
 def get_intent_engine() -> IntentEngine:
-    from app.main import app
-    return getattr(app.state, "intent_engine", None)
+    return _INTENT_ENGINE
 
 
 def get_supabase_service() -> SupabaseService:
-    from app.main import app
-    return getattr(app.state, "supabase_service", None)
+    return _SUPABASE_SERVICE
 
 
 def get_gemini_service() -> GeminiService | None:
-    from app.main import app
-    return getattr(app.state, "gemini_service", None)
+    return _GEMINI_SERVICE
 
 
 def get_council_service() -> CouncilService | None:
-    from app.main import app
-    return getattr(app.state, "council_service", None)
+    return _COUNCIL_SERVICE
 
 
 def get_hazard_knowledge() -> HazardKnowledgeBase | None:
-    from app.main import app
-    return getattr(app.state, "hazard_knowledge", None)
+    return _HAZARD_KNOWLEDGE
 
 
 def get_topic_knowledge() -> TopicKnowledgeBase | None:
-    from app.main import app
-    return getattr(app.state, "topic_knowledge", None)
+    return _TOPIC_KNOWLEDGE
 
 
 def get_container_status_service() -> ContainerStatusService | None:
-    from app.main import app
-    return getattr(app.state, "container_status_service", None)
+    return _CONTAINER_STATUS_SERVICE
 
 
 def get_manager_gpt_service() -> ManagerGPTService | None:
-    from app.main import app
-    return getattr(app.state, "manager_gpt_service", None)
-
-
-def get_notebooklm_client() -> NotebookLMClient:
-    """Get or create NotebookLM client."""
-    from app.config import get_settings
-    settings = get_settings()
-    # Use Gemini API key if available (for NotebookLM Enterprise authentication)
-    api_key = getattr(settings, "gemini_api_key", None)
-    project_number = getattr(settings, "google_cloud_project_number", None)
-    location = getattr(settings, "notebooklm_location", "global")
-    endpoint_location = getattr(settings, "notebooklm_endpoint_location", "global")
-    notebook_id = getattr(settings, "notebooklm_notebook_id", None)
-    
-    return NotebookLMClient(
-        api_key=api_key,
-        project_number=project_number,
-        location=location,
-        endpoint_location=endpoint_location,
-        notebook_id=notebook_id,
+    return _MANAGER_GPT_SERVICE
+
+
+def get_query_log() -> QueryLogWriter | None:
+    return _QUERY_LOG
+
+
+def get_notebooklm_client() -> NotebookLMClient | None:
+    return _NOTEBOOKLM_CLIENT
+
+
+@lru_cache(maxsize=1)
+def _default_metrics_range(today_ordinal: int) -> tuple[dt.date, dt.date]:
+    """Return (start_date, end_date) of the default metrics window for the given day."""
+    end_date = dt.date.fromordinal(today_ordinal)
+    start_date = dt.date(end_date.year - DEFAULT_METRICS_YEARS_BACK, 1, 1)
+    return start_date, end_date
+
+
+async def _get_default_metrics(supabase_service: SupabaseService) -> Mapping[str, Any]:
+    """
+    Fetch the metrics summary for the default window, reusing a cached copy
+    for up to METRICS_CACHE_TTL_SECONDS.
+    """
+    start_date, end_date = _default_metrics_range(dt.date.today().toordinal())
+    key = (start_date, end_date, DEFAULT_MAX_ROWS_FOR_LLM)
+    now = time.monotonic()
+    cached = _metrics_cache.get(key)
+    if cached and now - cached[0] < METRICS_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    metrics = await asyncio.to_thread(
+        supabase_service.get_metrics_summary,
+        start_date=start_date,
+        end_date=end_date,
+        max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
     )
+    # Keep a single entry (yesterday's window is never asked for again) and
+    # don't pin an empty summary caused by a transient Supabase failure.
+    _metrics_cache.clear()
+    if metrics.get("containers", {}).get("total_records") or metrics.get("vehicles", {}).get("total_records"):
+        _metrics_cache[key] = (now, metrics)
+    return metrics
 
 
 def get_version() -> str:
@@ -1177,7 +1246,190 @@ async def chat_page():
     return HTMLResponse(content=html_content)
 
 
-@router.post("/query", response_model=ChatResponse)
+@dataclasses.dataclass(slots=True)
+class _QueryContext:
+    """Services and per-request context shared by the intent handlers."""
+
+    supabase_service: SupabaseService
+    gemini_service: GeminiService | None
+    container_status_service: ContainerStatusService | None
+    manager_gpt_service: ManagerGPTService | None
+    knowledge_sections: list[dict[str, str]] | None
+    conversation_history: list[dict[str, Any]] | None
+    used_knowledge: bool = False  # Set when knowledge sections fed the response
+
+
+async def _answer_with_gemini(
+    incoming_text: str, ctx: _QueryContext, metrics: Mapping[str, Any]
+) -> str:
+    """
+    Ask Gemini with the metrics/knowledge context, appending a NotebookLM
+    suggestion when no knowledge was found or the answer indicates missing info.
+    """
+    gemini_service = ctx.gemini_service
+    response_text = await gemini_service.answer_question(
+        question=incoming_text,
+        metrics=metrics,
+        knowledge_sections=ctx.knowledge_sections,
+        conversation_history=ctx.conversation_history,
+    )
+    # If knowledge sections were provided and used, mark as used
+    if ctx.knowledge_sections:
+        ctx.used_knowledge = True
+
+    # If no knowledge sections were found and response indicates no info,
+    # try NotebookLM as fallback
+    if not ctx.knowledge_sections or (
+        not ctx.used_knowledge and
+        any(indicator in response_text.lower() for indicator in NOTEBOOKLM_FALLBACK_INDICATORS)
+    ):
+        logger.info("No knowledge found or response indicates no info, trying NotebookLM")
+        notebooklm_client = get_notebooklm_client()
+        if notebooklm_client is None:
+            return response_text
+        try:
+            notebooklm_result = await notebooklm_client.try_query_with_gemini_fallback(
+                question=incoming_text,
+                gemini_service=gemini_service,
+            )
+            # Append NotebookLM suggestion to response
+            if notebooklm_result and notebooklm_result not in response_text:
+                response_text += f"\n\n{notebooklm_result}"
+        except Exception as e:
+            logger.warning("NotebookLM query failed: %s", e)
+    return response_text
+
+
+async def _handle_daily(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    target_date = intent.target_date
+    if not target_date:
+        return build_fallback_response()
+    count = await asyncio.to_thread(ctx.supabase_service.get_daily_containers_count, target_date)
+    return build_daily_containers_response(count, target_date)
+
+
+async def _handle_containers_range(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    start_date, end_date = intent.start_date, intent.end_date
+    if not (start_date and end_date):
+        return build_fallback_response()
+    count = await asyncio.to_thread(
+        ctx.supabase_service.get_containers_count_between, start_date, end_date
+    )
+    return build_containers_range_response(count, start_date, end_date)
+
+
+async def _handle_vehicles_range(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    start_date, end_date = intent.start_date, intent.end_date
+    if not (start_date and end_date):
+        return build_fallback_response()
+    count = await asyncio.to_thread(
+        ctx.supabase_service.get_vehicle_count_between, start_date, end_date
+    )
+    return build_vehicles_range_response(count, start_date, end_date)
+
+
+async def _handle_monthly(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    month, year = intent.month, intent.year
+    if not (month and year):
+        logger.warning("Missing month or year parameters for containers_count_monthly")
+        return build_fallback_response()
+    try:
+        count = await asyncio.to_thread(
+            ctx.supabase_service.get_containers_count_monthly, month, year
+        )
+        return build_monthly_containers_response(count, month, year)
+    except Exception as e:
+        logger.error("Error getting monthly container count: %s", e, exc_info=True)
+        return build_fallback_response()
+
+
+async def _handle_comparison(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    params = intent.parameters
+    month1, year1 = params.get("month1"), params.get("year1")
+    month2, year2 = params.get("month2"), params.get("year2")
+    if not (month1 and year1 and month2 and year2):
+        return build_fallback_response()
+    # Both month counts come back from a single Supabase round-trip; run it
+    # off the event loop since the service is synchronous.
+    comparison = await asyncio.to_thread(
+        ctx.supabase_service.get_containers_count_comparison, month1, year1, month2, year2
+    )
+    return build_comparison_containers_response(
+        comparison["count1"], month1, year1,
+        comparison["count2"], month2, year2,
+        comparison["difference"],
+    )
+
+
+async def _handle_container_status(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    container_id = intent.container_id
+    if not (container_id and ctx.container_status_service):
+        return build_fallback_response()
+    try:
+        statuses = await ctx.container_status_service.lookup(container_id)
+        return build_container_status_response(container_id, statuses)
+    except Exception as e:
+        logger.error("Error getting container status: %s", e, exc_info=True)
+        return build_fallback_response()
+
+
+async def _handle_procedure(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    # Route procedure questions directly to NotebookLM with direct link
+    question = intent.question or incoming_text
+    logger.info("Procedure question detected, providing NotebookLM link: %s", question)
+
+    # Always provide direct link with the question (don't try API first)
+    return (
+        f"למידע נוסף וספציפי לגבי נהלי תור בנמל, אנא בדוק ב-NotebookLM: "
+        f"[פתח קישור]({NOTEBOOKLM_NOTEBOOK_URL})\n\n"
+        f"שאלתך: {question}"
+    )
+
+
+async def _handle_manager(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    question = intent.question or incoming_text
+    if not ctx.manager_gpt_service:
+        return build_fallback_response()
+    try:
+        return await ctx.manager_gpt_service.answer_manager_question(question=question)
+    except Exception as e:
+        logger.error("Error calling Manager GPT service: %s", e, exc_info=True)
+        return build_fallback_response()
+
+
+async def _handle_llm_analysis(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    # Route to Gemini for analysis
+    if not ctx.gemini_service:
+        return build_fallback_response()
+    metrics = await _get_default_metrics(ctx.supabase_service)
+    try:
+        return await _answer_with_gemini(incoming_text, ctx, metrics)
+    except Exception as e:
+        logger.error("Error calling Gemini service: %s", e, exc_info=True)
+        return build_fallback_response()
+
+
+async def _handle_fallback(intent: IntentResult, incoming_text: str, ctx: _QueryContext) -> str:
+    return build_fallback_response()
+
+
+# Intent name (as produced by IntentEngine) -> handler returning the response text
+_INTENT_HANDLERS: dict[str, Callable[[IntentResult, str, _QueryContext], Awaitable[str]]] = {
+    "daily_containers_count": _handle_daily,
+    "containers_count_between": _handle_containers_range,
+    "vehicles_count_between": _handle_vehicles_range,
+    "containers_count_monthly": _handle_monthly,
+    "containers_count_comparison": _handle_comparison,
+    "container_status_lookup": _handle_container_status,
+    "procedure_question": _handle_procedure,
+    "manager_question": _handle_manager,
+    "llm_analysis": _handle_llm_analysis,
+}
+
+
+# ChatResponse documents the payload; the handler builds the JSON body itself so
+# FastAPI doesn't re-validate a model we just constructed.
+@router.post("/query", response_class=ORJSONResponse, responses={200: {"model": ChatResponse}})
 async def chat_query(
     request: ChatRequest,
     intent_engine: IntentEngine = Depends(get_intent_engine),
@@ -1188,38 +1440,36 @@ async def chat_query(
     topic_knowledge: TopicKnowledgeBase | None = Depends(get_topic_knowledge),
     container_status_service: ContainerStatusService | None = Depends(get_container_status_service),
     manager_gpt_service: ManagerGPTService | None = Depends(get_manager_gpt_service),
-) -> ChatResponse:
+    query_log: QueryLogWriter | None = Depends(get_query_log),
+) -> ORJSONResponse:
     """
     Handle chat queries and return responses.
     Uses the same logic as the webhook handler but without Green API.
     """
-    import datetime as dt
-    
     try:
-        incoming_text = request.question.strip()
-        if not incoming_text:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Question cannot be empty")
+        # ChatRequest validation strips whitespace and rejects empty questions (422)
+        incoming_text = request.question
         
-        logger.info("Chat query received: %s", incoming_text)
+        # Evaluate the level once; per-step INFO logs below are skipped cheaply
+        # when INFO is disabled, and the request is summarized in one record.
+        info_on = logger.isEnabledFor(logging.INFO)
         
-        # Use user_id if provided, otherwise use a default
-        user_id = request.user_id or "web_user"
-        chat_id = f"{user_id}@web"
+        user_id = request.user_id
+        is_anonymous = user_id == ANON_USER_ID
+        chat_id = ANON_CHAT_ID if is_anonymous else f"{user_id}@web"
         
         # Match intent
         intent: IntentResult | None = intent_engine.match(incoming_text)
-        logger.info("Intent matched: %s (parameters: %s)", intent.name if intent else "None", intent.parameters if intent else "None")
         
         # Get conversation history if user_id is provided
         conversation_history = None
-        if request.user_id:
-            conversation_history = supabase_service.get_recent_user_queries(
+        if not is_anonymous:
+            conversation_history = await asyncio.to_thread(
+                supabase_service.get_recent_user_queries,
                 user_phone=chat_id,
                 limit=MAX_CONVERSATION_HISTORY,
                 exclude_current=True,
             )
-            if conversation_history:
-                logger.info("Retrieved %d previous queries for context", len(conversation_history))
         
         # Get knowledge sections
         hazard_sections = (
@@ -1242,24 +1492,26 @@ async def chat_query(
         
         combined_knowledge = knowledge_sections if knowledge_sections else None
         
+        ctx = _QueryContext(
+            supabase_service=supabase_service,
+            gemini_service=gemini_service,
+            container_status_service=container_status_service,
+            manager_gpt_service=manager_gpt_service,
+            knowledge_sections=combined_knowledge,
+            conversation_history=conversation_history,
+        )
         response_text = ""
         intent_name = None
-        citations_list = []
-        used_knowledge = False  # Track if knowledge sections were used in the response
         
         if not intent:
-            logger.info("No intent matched, using Council/Gemini or fallback")
-            end_date = dt.date.today()
-            start_date = dt.date(end_date.year - DEFAULT_METRICS_YEARS_BACK, 1, 1)
-            metrics = supabase_service.get_metrics_summary(
-                start_date=start_date,
-                end_date=end_date,
-                max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
-            )
+            if info_on:
+                logger.info("No intent matched, using Council/Gemini or fallback")
+            metrics = await _get_default_metrics(supabase_service)
             
             try:
                 if council_service:
-                    logger.info("Using Council service...")
+                    if info_on:
+                        logger.info("Using Council service...")
                     response_text = await council_service.answer_question(
                         question=incoming_text,
                         metrics=metrics,
@@ -1268,207 +1520,28 @@ async def chat_query(
                     )
                     # If knowledge sections were provided and used, mark as used
                     if combined_knowledge:
-                        used_knowledge = True
+                        ctx.used_knowledge = True
                 elif gemini_service:
-                    logger.info("Using Gemini service...")
-                    response_text = await gemini_service.answer_question(
-                        question=incoming_text,
-                        metrics=metrics,
-                        knowledge_sections=combined_knowledge,
-                        conversation_history=conversation_history,
-                    )
-                    # If knowledge sections were provided and used, mark as used
-                    if combined_knowledge:
-                        used_knowledge = True
-                    
-                    # If no knowledge sections were found and response indicates no info,
-                    # try NotebookLM as fallback
-                    if not combined_knowledge or (
-                        not used_knowledge and 
-                        any(indicator in response_text.lower() for indicator in [
-                            "אין מידע", "לא זמין", "לא ניתן לספק", "אינם כוללים"
-                        ])
-                    ):
-                        logger.info("No knowledge found or response indicates no info, trying NotebookLM")
-                        notebooklm_client = get_notebooklm_client()
-                        try:
-                            notebooklm_result = await notebooklm_client.try_query_with_gemini_fallback(
-                                question=incoming_text,
-                                gemini_service=gemini_service,
-                            )
-                            # Append NotebookLM suggestion to response
-                            if notebooklm_result and notebooklm_result not in response_text:
-                                response_text += f"\n\n{notebooklm_result}"
-                        except Exception as e:
-                            logger.warning("NotebookLM query failed: %s", e)
+                    if info_on:
+                        logger.info("Using Gemini service...")
+                    response_text = await _answer_with_gemini(incoming_text, ctx, metrics)
                 else:
-                    logger.info("No LLM service available, using fallback")
+                    if info_on:
+                        logger.info("No LLM service available, using fallback")
                     response_text = build_fallback_response()
             except Exception as e:
                 logger.error("Error calling LLM service: %s", e, exc_info=True)
                 response_text = build_fallback_response()
-            
-            if not response_text or not response_text.strip():
-                response_text = build_fallback_response()
         else:
             intent_name = intent.name
-            
-            # Handle different intents
-            if intent.name == "containers_count_monthly":
-                month = intent.parameters.get("month")
-                year = intent.parameters.get("year")
-                if month and year:
-                    try:
-                        count = supabase_service.get_containers_count_monthly(month=month, year=year)
-                        response_text = build_monthly_containers_response(month=month, year=year, count=count)
-                    except Exception as e:
-                        logger.error("Error getting monthly container count: %s", e, exc_info=True)
-                        response_text = build_fallback_response()
-                else:
-                    logger.warning("Missing month or year parameters for containers_count_monthly")
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "containers_count_daily":
-                date = intent.parameters.get("date")
-                if date:
-                    count = supabase_service.get_daily_container_count(date=date)
-                    response_text = build_daily_containers_response(date=date, count=count)
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "containers_count_range":
-                start_date = intent.parameters.get("start_date")
-                end_date = intent.parameters.get("end_date")
-                if start_date and end_date:
-                    count = supabase_service.get_container_count_range(start_date=start_date, end_date=end_date)
-                    response_text = build_containers_range_response(start_date=start_date, end_date=end_date, count=count)
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "containers_comparison":
-                start_date = intent.parameters.get("start_date")
-                end_date = intent.parameters.get("end_date")
-                if start_date and end_date:
-                    count1 = supabase_service.get_container_count_range(
-                        start_date=start_date, end_date=start_date
-                    )
-                    count2 = supabase_service.get_container_count_range(
-                        start_date=end_date, end_date=end_date
-                    )
-                    response_text = build_comparison_containers_response(
-                        date1=start_date, count1=count1, date2=end_date, count2=count2
-                    )
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "vehicles_count_range":
-                start_date = intent.parameters.get("start_date")
-                end_date = intent.parameters.get("end_date")
-                if start_date and end_date:
-                    count = supabase_service.get_vehicle_count_range(start_date=start_date, end_date=end_date)
-                    response_text = build_vehicles_range_response(start_date=start_date, end_date=end_date, count=count)
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "container_status_lookup":
-                container_id = intent.parameters.get("container_id")
-                if container_id and container_status_service:
-                    try:
-                        statuses = await container_status_service.lookup(container_id)
-                        response_text = build_container_status_response(container_id, statuses)
-                    except Exception as e:
-                        logger.error("Error getting container status: %s", e, exc_info=True)
-                        response_text = build_fallback_response()
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "procedure_question":
-                # Route procedure questions directly to NotebookLM with direct link
-                question = intent.parameters.get("question", incoming_text)
-                logger.info("Procedure question detected, providing NotebookLM link: %s", question)
-                
-                # Build NotebookLM URL
-                notebook_id = "66688b34-ca77-4097-8ac8-42ca8285681f"
-                notebook_url = f"https://notebooklm.google.com/notebook/{notebook_id}"
-                
-                # Always provide direct link with the question (don't try API first)
-                response_text = (
-                    f"למידע נוסף וספציפי לגבי נהלי תור בנמל, אנא בדוק ב-NotebookLM: "
-                    f"[פתח קישור]({notebook_url})\n\n"
-                    f"שאלתך: {question}"
-                )
-                
-                # Set auto-open URL and question for later use
-                intent_name = intent.name
-            
-            elif intent.name == "manager_question":
-                question = intent.parameters.get("question", incoming_text)
-                if manager_gpt_service:
-                    try:
-                        response_text = await manager_gpt_service.answer_manager_question(question=question)
-                    except Exception as e:
-                        logger.error("Error calling Manager GPT service: %s", e, exc_info=True)
-                        response_text = build_fallback_response()
-                else:
-                    response_text = build_fallback_response()
-            
-            elif intent.name == "llm_analysis":
-                # Route to Gemini for analysis
-                end_date = dt.date.today()
-                start_date = dt.date(end_date.year - DEFAULT_METRICS_YEARS_BACK, 1, 1)
-                metrics = supabase_service.get_metrics_summary(
-                    start_date=start_date,
-                    end_date=end_date,
-                    max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
-                )
-                
-                if gemini_service:
-                    try:
-                        response_text = await gemini_service.answer_question(
-                            question=incoming_text,
-                            metrics=metrics,
-                            knowledge_sections=combined_knowledge,
-                            conversation_history=conversation_history,
-                        )
-                        # If knowledge sections were provided and used, mark as used
-                        if combined_knowledge:
-                            used_knowledge = True
-                        
-                        # If no knowledge sections were found and response indicates no info,
-                        # try NotebookLM as fallback
-                        if not combined_knowledge or (
-                            not used_knowledge and 
-                            any(indicator in response_text.lower() for indicator in [
-                                "אין מידע", "לא זמין", "לא ניתן לספק", "אינם כוללים"
-                            ])
-                        ):
-                            logger.info("No knowledge found or response indicates no info, trying NotebookLM")
-                            notebooklm_client = get_notebooklm_client()
-                            try:
-                                notebooklm_result = await notebooklm_client.try_query_with_gemini_fallback(
-                                    question=incoming_text,
-                                    gemini_service=gemini_service,
-                                )
-                                # Append NotebookLM suggestion to response
-                                if notebooklm_result and notebooklm_result not in response_text:
-                                    response_text += f"\n\n{notebooklm_result}"
-                            except Exception as e:
-                                logger.warning("NotebookLM query failed: %s", e)
-                    except Exception as e:
-                        logger.error("Error calling Gemini service: %s", e, exc_info=True)
-                        response_text = build_fallback_response()
-                else:
-                    response_text = build_fallback_response()
-            
-            else:
-                response_text = build_fallback_response()
+            handler = _INTENT_HANDLERS.get(intent.name, _handle_fallback)
+            response_text = await handler(intent, incoming_text, ctx)
+        used_knowledge = ctx.used_knowledge
     
         # Ensure we have a response
         if not response_text or not response_text.strip():
             response_text = build_fallback_response()
         
-        logger.info("Chat response: %s", response_text[:200])
-        
         # Collect citations from knowledge sections only if they were actually used
         # Don't show citations if the response explicitly states that information is not available
         citations = None
@@ -1498,33 +1571,30 @@ async def chat_query(
                 citations = []
                 for section in knowledge_sections:
                     citations.append(
-                        Citation(
-                            document_title=section.get("document_title") or section.get("topic"),
-                            source_file=section.get("source_file"),
-                            excerpt=section.get("excerpt", ""),
-                            section_id=section.get("section_id"),
-                        )
+                        {
+                            "document_title": section.get("document_title") or section.get("topic"),
+                            "source_file": section.get("source_file"),
+                            "excerpt": section.get("excerpt", ""),
+                            "section_id": section.get("section_id"),
+                        }
                     )
             else:
-                logger.info("Not showing citations - response indicates information is not available")
+                if info_on:
+                    logger.info("Not showing citations - response indicates information is not available")
         
-        # Log the query to Supabase for history tracking
-        try:
-            intent_params = {}
-            if intent:
-                intent_params = dict(intent.parameters) if intent.parameters else {}
-            
-            supabase_service.log_query(
-                user_phone=chat_id,
-                user_text=incoming_text,
-                intent=intent_name or "unknown",
-                parameters=intent_params,
-                response_text=response_text,
-            )
-            logger.info("Query logged to Supabase for %s", chat_id)
-        except Exception as e:
-            logger.error("Failed to log query to Supabase: %s", e, exc_info=True)
-            # Don't fail the request if logging fails
+        # Queue the query for the Supabase log (batched, for history tracking)
+        if query_log:
+            try:
+                query_log.log_query(
+                    user_phone=chat_id,
+                    user_text=incoming_text,
+                    intent=intent_name or "unknown",
+                    parameters=intent.parameters if intent else NO_PARAMETERS,
+                    response_text=response_text,
+                )
+            except Exception as e:
+                logger.error("Failed to log query to Supabase: %s", e, exc_info=True)
+                # Don't fail the request if logging fails
         
         # Check if this should auto-open NotebookLM
         # All questions that are NOT quantity questions should open NotebookLM
@@ -1542,25 +1612,45 @@ async def chat_query(
         
         # If no intent matched OR intent is not a quantity question, redirect to NotebookLM
         if not intent or (intent.name not in quantity_intents):
-            notebook_id = "66688b34-ca77-4097-8ac8-42ca8285681f"
-            auto_open_url = f"https://notebooklm.google.com/notebook/{notebook_id}"
+            auto_open_url = NOTEBOOKLM_NOTEBOOK_URL
             auto_open_question = incoming_text
         
-        return ChatResponse(
-            answer=response_text, 
-            intent=intent_name, 
-            citations=citations,
-            auto_open_url=auto_open_url,
-            auto_open_question=auto_open_question,
+        if info_on:
+            summary = {
+                "chat_id": chat_id,
+                "intent": intent_name,
+                "history_len": len(conversation_history) if conversation_history else 0,
+                "answer_len": len(response_text),
+            }
+            logger.info(
+                "Chat query done: chat_id=%(chat_id)s intent=%(intent)s "
+                "history=%(history_len)d answer_len=%(answer_len)d",
+                summary,
+                extra=summary,
+            )
+        
+        return ORJSONResponse(
+            {
+                "answer": response_text,
+                "intent": intent_name,
+                "citations": citations,
+                "auto_open_url": auto_open_url,
+                "auto_open_question": auto_open_question,
+            }
         )
-    except HTTPException:
-        # Re-raise HTTP exceptions (like 400 Bad Request)
-        raise
     except Exception as e:
         # Catch any other unexpected errors
         logger.error("Unexpected error in chat_query: %s", e, exc_info=True)
         error_message = f"מצטער, אירעה שגיאה בעיבוד השאלה. אנא נסה שוב מאוחר יותר."
-        return ChatResponse(answer=error_message, intent=None, citations=None)
+        return ORJSONResponse(
+            {
+                "answer": error_message,
+                "intent": None,
+                "citations": None,
+                "auto_open_url": None,
+                "auto_open_question": None,
+            }
+        )
 
 
 @router.get("/notebooklm-helper", response_class=HTMLResponse)
@@ -1791,7 +1881,7 @@ async def get_recent_queries(
     """Get the 100 most recent queries from the database (always fetches fresh from DB)."""
     try:
         logger.info("Fetching recent queries from database...")
-        queries = supabase_service.get_recent_queries(limit=100)
+        queries = await asyncio.to_thread(supabase_service.get_recent_queries, limit=100)
         logger.info("Retrieved %d queries from database", len(queries))
         
         # Convert to response model
@@ -4,17 +4,32 @@ HTTP routes that integrate with the Green API webhook flow.
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import dataclasses
+import hmac
 import logging
+import time
+import urllib.parse
 import datetime as dt
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Mapping
+
+import aiojobs
+import orjson
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Depends,
+    FastAPI,
     Header,
     HTTPException,
+    Request,
     Response,
     status,
 )
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 
 from app.constants import (
     MAX_CONVERSATION_HISTORY,
@@ -22,7 +37,7 @@ from app.constants import (
     DEFAULT_MAX_ROWS_FOR_LLM,
 )
 from app.models.greenapi import GreenWebhookPayload
-from app.services.intent_engine import IntentEngine, IntentResult
+from app.services.intent_engine import NO_PARAMETERS, IntentEngine, IntentResult
 from app.services.response_builder import (
     build_containers_range_response,
     build_daily_containers_response,
@@ -40,6 +55,9 @@ from app.services.hazard_knowledge import HazardKnowledgeBase
 from app.services.topic_knowledge import TopicKnowledgeBase
 from app.services.container_status import ContainerStatusService
 from app.services.manager_gpt_service import ManagerGPTService
+from app.services.query_log import QueryLogWriter
+from app.services.response_cache import ResponseCache
+from app.services.semantic_cache import SemanticCache, SemanticLookup
 
 logger = logging.getLogger(__name__)
 
@@ -57,32 +75,15 @@ def _should_add_greeting(conversation_history: list[dict] | None) -> bool:
     Returns True if this looks like the first message in a new conversation
     (no history, or last message was more than NEW_CONVERSATION_THRESHOLD_SECONDS ago).
     """
-    try:
-        if not conversation_history:
-            # No history at all -> definitely a new conversation
-            return True
-
-        last_entry = conversation_history[-1]
-        created_at = last_entry.get("created_at")
-        if not created_at:
-            return False
-
-        # Supabase timestamps are ISO strings, often with 'Z' suffix
-        created_str = str(created_at)
-        if created_str.endswith("Z"):
-            created_str = created_str.replace("Z", "+00:00")
-
-        last_dt = dt.datetime.fromisoformat(created_str)
-        if last_dt.tzinfo is None:
-            # Assume UTC if timezone is not present
-            last_dt = last_dt.replace(tzinfo=dt.timezone.utc)
-
-        now_utc = dt.datetime.now(dt.timezone.utc)
-        diff_seconds = (now_utc - last_dt).total_seconds()
-        return diff_seconds > NEW_CONVERSATION_THRESHOLD_SECONDS
-    except Exception as e:
-        logger.error("Failed to determine if greeting is needed: %s", e, exc_info=True)
+    if not conversation_history:
+        # No history at all -> definitely a new conversation
+        return True
+
+    # Epoch seconds, parsed from created_at by get_recent_user_queries
+    last_ts = conversation_history[-1].get("created_ts")
+    if last_ts is None:
         return False
+    return time.time() - last_ts > NEW_CONVERSATION_THRESHOLD_SECONDS
 
 
 def _maybe_prefix_greeting(
@@ -96,6 +97,178 @@ def _maybe_prefix_greeting(
     return response_text
 
 
+def _trunc(text: str, limit: int) -> str:
+    """Shorten `text` to `limit` characters for log previews."""
+    return text if len(text) <= limit else f"{text[:limit]}…"
+
+
+# Identical messages ("status", quick replies, ...) recur a lot, so intent
+# matching is memoized. Today's date is part of the key because some intents
+# resolve relative dates ("today", current year) at match time.
+@lru_cache(maxsize=4096)
+def _match_intent_cached(
+    intent_engine: IntentEngine, text: str, today_ordinal: int
+) -> IntentResult | None:
+    return intent_engine.match(text)
+
+
+def match_intent(intent_engine: IntentEngine, text: str) -> IntentResult | None:
+    """Match `text` via the intent engine, reusing results for repeated messages."""
+    return _match_intent_cached(intent_engine, text.strip(), dt.date.today().toordinal())
+
+
+def clear_intent_cache() -> None:
+    """Drop memoized intent matches (call when the intent engine is (re)created)."""
+    _match_intent_cached.cache_clear()
+
+
+def log_intent_cache_stats() -> None:
+    """Log hit/miss counts of the intent match cache."""
+    info = _match_intent_cached.cache_info()
+    lookups = info.hits + info.misses
+    logger.info(
+        "Intent cache: %d hits / %d lookups (%.1f%%), %d/%d entries",
+        info.hits,
+        lookups,
+        100.0 * info.hits / lookups if lookups else 0.0,
+        info.currsize,
+        info.maxsize,
+    )
+
+
+# Year-wide metrics used to double-check zero monthly counts. The same hot
+# year is asked about repeatedly, so the summary is kept for a few minutes.
+YEAR_METRICS_CACHE_TTL_SECONDS = 5 * 60
+_year_metrics_cache: dict[int, tuple[float, Mapping[str, Any]]] = {}
+# Fetches in progress by year; each entry is dropped as soon as its fetch ends
+_year_metrics_fetches: dict[int, asyncio.Task[Mapping[str, Any]]] = {}
+
+
+async def _get_year_metrics(supabase_service: SupabaseService, year: int) -> Mapping[str, Any]:
+    """
+    Fetch the metrics summary for a whole calendar year, reusing a cached copy
+    for up to YEAR_METRICS_CACHE_TTL_SECONDS. Concurrent misses for the same
+    year share one Supabase fetch.
+    """
+    now = time.monotonic()
+    cached = _year_metrics_cache.get(year)
+    if cached and now - cached[0] < YEAR_METRICS_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    # Expired years are removed here rather than only overwritten
+    for stale_year in [
+        y for y, (fetched_at, _) in _year_metrics_cache.items()
+        if now - fetched_at >= YEAR_METRICS_CACHE_TTL_SECONDS
+    ]:
+        del _year_metrics_cache[stale_year]
+
+    task = _year_metrics_fetches.get(year)
+    if task is None:
+        task = asyncio.create_task(_fetch_year_metrics(supabase_service, year))
+        _year_metrics_fetches[year] = task
+        task.add_done_callback(lambda _: _year_metrics_fetches.pop(year, None))
+    # Shielded so one caller giving up does not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+async def _fetch_year_metrics(supabase_service: SupabaseService, year: int) -> Mapping[str, Any]:
+    metrics = await asyncio.to_thread(
+        supabase_service.get_metrics_summary,
+        start_date=dt.date(year, 1, 1),
+        end_date=dt.date(year, 12, 31),
+        max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
+    )
+    _year_metrics_cache[year] = (time.monotonic(), metrics)
+    return metrics
+
+
+# Months whose zero count the LLM re-check already confirmed, keyed by
+# (month, year) -> monotonic time. Within ZERO_MONTH_RECHECK_SECONDS a repeat
+# question returns the zero count without another year-metrics fetch and LLM
+# call; after that the data may have been loaded, so it is checked again.
+ZERO_MONTH_RECHECK_SECONDS = 15 * 60
+_zero_month_verified_at: dict[tuple[int, int], float] = {}
+
+
+# Upper bound for a single free-text LLM answer. Large metrics payloads make
+# Gemini take well over 10s, so this only cuts off calls that are stuck.
+LLM_ANSWER_TIMEOUT_SECONDS = 30.0
+# Caps on concurrent LLM calls from this route, one per provider quota, so a
+# burst of messages queues here instead of exhausting quota and sockets.
+# Manager GPT runs on the same Gemini API key, so it shares Gemini's budget.
+MAX_CONCURRENT_GEMINI_CALLS = 8
+MAX_CONCURRENT_COUNCIL_CALLS = 4
+_gemini_semaphore = asyncio.Semaphore(MAX_CONCURRENT_GEMINI_CALLS)
+_council_semaphore = asyncio.Semaphore(MAX_CONCURRENT_COUNCIL_CALLS)
+
+
+@contextlib.asynccontextmanager
+async def _llm_slot(semaphore: asyncio.Semaphore, service_name: str):
+    """Hold one of the provider's concurrency slots, logging when we have to wait."""
+    if semaphore.locked():
+        logger.info("All %s slots busy; queueing LLM call", service_name)
+    async with semaphore:
+        yield
+
+
+# How long similar-question answers are reused (see SemanticCache). Free-text
+# answers quote today's metrics; manager answers come from static guidance.
+FREE_TEXT_SEMANTIC_CACHE_TTL_SECONDS = 60 * 60
+MANAGER_SEMANTIC_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+
+async def _llm_answer(
+    question: str,
+    metrics: Mapping[str, Any],
+    knowledge_sections: list[Mapping[str, str]] | None,
+    conversation_history: list[dict] | None,
+    council_service: CouncilService | None,
+    gemini_service: GeminiService | None,
+) -> str | None:
+    """
+    Answer a free-text question with Council if configured, otherwise Gemini.
+
+    Returns None when no LLM is configured, the call fails or times out, or
+    the answer is blank, so callers can pick their own fallback.
+    """
+    if council_service:
+        service, service_name, semaphore = council_service, "Council", _council_semaphore
+    elif gemini_service:
+        service, service_name, semaphore = gemini_service, "Gemini", _gemini_semaphore
+    else:
+        logger.debug("Neither Council nor Gemini service available, using fallback")
+        return None
+
+    try:
+        async with _llm_slot(semaphore, service_name):
+            answer = await asyncio.wait_for(
+                service.answer_question(
+                    question=question,
+                    metrics=metrics,
+                    knowledge_sections=knowledge_sections,
+                    conversation_history=conversation_history,
+                ),
+                timeout=LLM_ANSWER_TIMEOUT_SECONDS,
+            )
+    except asyncio.TimeoutError:
+        logger.warning("%s did not answer within %.0fs, using fallback", service_name, LLM_ANSWER_TIMEOUT_SECONDS)
+        return None
+    except Exception as e:
+        logger.error("Error calling %s service: %s", service_name, e, exc_info=True)
+        return None
+
+    if not answer or not answer.strip():
+        logger.warning("%s returned empty response, using fallback", service_name)
+        return None
+    return answer
+
+
+# typeMessage values carrying textMessageData. Green API sends the camelCase
+# form; the lowercase spellings were accepted before and still are.
+_TEXT_MESSAGE_TYPES = frozenset(
+    {"textMessage", "extendedTextMessage", "textmessage", "extendedtextmessage"}
+)
+
 # Static template mappings for short codes (e.g., WhatsApp quick replies)
 SWE_TEMPLATE_MAP: dict[str, str] = {
     # SWE001: monthly container count for a specific month (here: January 2024)
@@ -103,18 +276,24 @@ SWE_TEMPLATE_MAP: dict[str, str] = {
     "{{SWE001}}": "כמה מכולות הנמל עשה בינואר 2024",
 }
 
+# Intents the template questions above resolve to, prebuilt so quick-reply
+# buttons skip intent matching and the knowledge-base lookups.
+SWE_INTENT_MAP: dict[str, IntentResult] = {
+    "{{SWE001}}": IntentResult(name="containers_count_monthly", parameters={"month": 1, "year": 2024}),
+}
+
 
 async def send_message_with_error_handling(
     client: GreenAPIClient, chat_id: str, message: str, 
-    supabase_service: SupabaseService | None = None,
+    query_log: QueryLogWriter | None = None,
     user_text: str | None = None,
     intent: str | None = None,
-    intent_params: dict | None = None,
+    intent_params: Mapping[str, Any] | None = None,
 ) -> None:
     """
     Send a message via Green API with proper error handling.
     Logs quota exceeded errors but doesn't crash the webhook.
-    Also logs the query to Supabase even if sending fails.
+    Also queues the query for the Supabase log even if sending fails.
     """
     send_success = False
     error_type = None
@@ -143,7 +322,7 @@ async def send_message_with_error_handling(
         # Don't re-raise - allow webhook to complete
     
     # Log to Supabase even if sending failed (for analytics)
-    if supabase_service and user_text:
+    if query_log and user_text:
         try:
             # Append error info to response if sending failed
             response_text = message
@@ -153,89 +332,450 @@ async def send_message_with_error_handling(
                 else:
                     response_text = f"{message}\n\n[⚠️ שגיאה בשליחת הודעה]"
             
-            supabase_service.log_query(
+            query_log.log_query(
                 user_phone=chat_id,
                 user_text=user_text,
                 intent=intent or "unknown",
-                parameters=intent_params or {},
+                parameters=intent_params or NO_PARAMETERS,
                 response_text=response_text,
             )
-            logger.info("Query logged to Supabase for %s (send_success=%s)", chat_id, send_success)
+            logger.debug("Query queued for Supabase log for %s (send_success=%s)", chat_id, send_success)
         except Exception as e:
             logger.error("Failed to log query to Supabase: %s", e, exc_info=True)
 
 
-def get_intent_engine() -> IntentEngine:
-    from app.main import app
+# Knowledge bases are loaded once per instance, so (instance, text) fully
+# determines the search result. Sections are read-only since they are shared.
+@lru_cache(maxsize=2048)
+def _search_knowledge_cached(
+    knowledge: HazardKnowledgeBase | TopicKnowledgeBase, text: str
+) -> tuple[Mapping[str, str], ...]:
+    return tuple(MappingProxyType(section) for section in knowledge.build_sections(text))
 
-    engine: IntentEngine = app.state.intent_engine
-    return engine
 
+def clear_knowledge_cache() -> None:
+    """Drop memoized knowledge searches (call when the knowledge bases are (re)created)."""
+    _search_knowledge_cached.cache_clear()
 
-def get_supabase_service() -> SupabaseService:
-    from app.main import app
 
-    service: SupabaseService = app.state.supabase_service
-    return service
+async def _build_knowledge_sections(
+    knowledge: HazardKnowledgeBase | TopicKnowledgeBase | None, text: str
+) -> list[Mapping[str, str]] | None:
+    """Search a knowledge base in a worker thread; None when it is not loaded."""
+    if not knowledge or not knowledge.is_available():
+        return None
+    normalized = " ".join(text.split())
+    return list(await asyncio.to_thread(_search_knowledge_cached, knowledge, normalized))
 
 
-def get_green_api_client() -> GreenAPIClient:
-    from app.main import app
+async def _combined_knowledge(
+    hazard_knowledge: HazardKnowledgeBase | None,
+    topic_knowledge: TopicKnowledgeBase | None,
+    text: str,
+) -> list[Mapping[str, str]] | None:
+    """Hazard sections followed by topic sections; None when neither has a match."""
+    hazard_sections, topic_sections = await asyncio.gather(
+        _build_knowledge_sections(hazard_knowledge, text),
+        _build_knowledge_sections(topic_knowledge, text),
+    )
+    return [*(hazard_sections or ()), *(topic_sections or ())] or None
+
+
+# Intents whose handlers always pass knowledge-base excerpts and conversation
+# history to the LLM. Every other intent only needs the last message time.
+_LLM_CONTEXT_INTENTS = frozenset({"llm_analysis"})
+_GREETING_HISTORY_FIELDS = ("created_at",)
+
+
+# Service singletons, bound once at startup by init_router() so the
+# dependency getters below are plain global reads.
+_INTENT_ENGINE: IntentEngine | None = None
+_SUPABASE_SERVICE: SupabaseService | None = None
+_GREEN_API_CLIENT: GreenAPIClient | None = None
+_GEMINI_SERVICE: GeminiService | None = None
+_COUNCIL_SERVICE: CouncilService | None = None
+_HAZARD_KNOWLEDGE: HazardKnowledgeBase | None = None
+_TOPIC_KNOWLEDGE: TopicKnowledgeBase | None = None
+_AUTH_REQUIRED: bool = False
+_WEBHOOK_TOKEN_B: bytes = b""
+_CONTAINER_STATUS_SERVICE: ContainerStatusService | None = None
+_MANAGER_GPT_SERVICE: ManagerGPTService | None = None
+_RESPONSE_CACHE: ResponseCache | None = None
+_SEMANTIC_CACHE: SemanticCache | None = None
+_QUERY_LOG: QueryLogWriter | None = None
+_SCHEDULER: aiojobs.Scheduler | None = None
+_MESSAGE_SCHEDULER: aiojobs.Scheduler | None = None
+
+
+def init_router(app: FastAPI) -> None:
+    """Bind the services created in the app lifespan to this router."""
+    global _INTENT_ENGINE, _SUPABASE_SERVICE, _GREEN_API_CLIENT, _GEMINI_SERVICE
+    global _COUNCIL_SERVICE, _HAZARD_KNOWLEDGE, _TOPIC_KNOWLEDGE
+    global _AUTH_REQUIRED, _WEBHOOK_TOKEN_B
+    global _CONTAINER_STATUS_SERVICE, _MANAGER_GPT_SERVICE, _RESPONSE_CACHE, _SCHEDULER
+    global _QUERY_LOG, _SEMANTIC_CACHE, _MESSAGE_SCHEDULER
+
+    state = app.state
+    _INTENT_ENGINE = state.intent_engine
+    _SUPABASE_SERVICE = state.supabase_service
+    _GREEN_API_CLIENT = state.green_api_client
+    _GEMINI_SERVICE = getattr(state, "gemini_service", None)
+    _COUNCIL_SERVICE = getattr(state, "council_service", None)
+    _HAZARD_KNOWLEDGE = getattr(state, "hazard_knowledge", None)
+    _TOPIC_KNOWLEDGE = getattr(state, "topic_knowledge", None)
+    webhook_token = getattr(state, "green_webhook_token", None)
+    _AUTH_REQUIRED = bool(webhook_token)
+    _WEBHOOK_TOKEN_B = webhook_token.encode("utf-8") if webhook_token else b""
+    _CONTAINER_STATUS_SERVICE = getattr(state, "container_status_service", None)
+    _MANAGER_GPT_SERVICE = getattr(state, "manager_gpt_service", None)
+    _RESPONSE_CACHE = getattr(state, "response_cache", None)
+    _SEMANTIC_CACHE = getattr(state, "semantic_cache", None)
+    _SCHEDULER = state.scheduler
+    _MESSAGE_SCHEDULER = state.message_scheduler
+    _QUERY_LOG = getattr(state, "query_log", None)
 
-    client: GreenAPIClient = app.state.green_api_client
-    return client
 
+def get_intent_engine() -> IntentEngine:
+    return _INTENT_ENGINE
 
-def get_gemini_service() -> GeminiService | None:
-    from app.main import app
 
-    return app.state.gemini_service
+def get_supabase_service() -> SupabaseService:
+    return _SUPABASE_SERVICE
 
 
-def get_council_service() -> CouncilService | None:
-    from app.main import app
+def get_green_api_client() -> GreenAPIClient:
+    return _GREEN_API_CLIENT
 
-    return getattr(app.state, "council_service", None)
 
+def get_gemini_service() -> GeminiService | None:
+    return _GEMINI_SERVICE
 
-def get_hazard_knowledge() -> HazardKnowledgeBase | None:
-    from app.main import app
 
-    return getattr(app.state, "hazard_knowledge", None)
+def get_council_service() -> CouncilService | None:
+    return _COUNCIL_SERVICE
+
+
+def get_hazard_knowledge() -> HazardKnowledgeBase | None:
+    return _HAZARD_KNOWLEDGE
 
 
 def get_topic_knowledge() -> TopicKnowledgeBase | None:
-    from app.main import app
+    return _TOPIC_KNOWLEDGE
+
+
+def get_container_status_service() -> ContainerStatusService | None:
+    return _CONTAINER_STATUS_SERVICE
 
-    return getattr(app.state, "topic_knowledge", None)
 
+def get_manager_gpt_service() -> ManagerGPTService | None:
+    return _MANAGER_GPT_SERVICE
 
-def get_webhook_token() -> str | None:
-    from app.main import app
 
-    return getattr(app.state, "green_webhook_token", None)
+def get_response_cache() -> ResponseCache | None:
+    return _RESPONSE_CACHE
 
 
-def get_container_status_service() -> ContainerStatusService | None:
-    from app.main import app
+def get_semantic_cache() -> SemanticCache | None:
+    return _SEMANTIC_CACHE
 
-    return getattr(app.state, "container_status_service", None)
 
+def get_scheduler() -> aiojobs.Scheduler:
+    return _SCHEDULER
 
-def get_manager_gpt_service() -> ManagerGPTService | None:
-    from app.main import app
 
-    return getattr(app.state, "manager_gpt_service", None)
+def get_message_scheduler() -> aiojobs.Scheduler:
+    return _MESSAGE_SCHEDULER
+
+
+def get_query_log() -> QueryLogWriter | None:
+    return _QUERY_LOG
+
+
+@dataclasses.dataclass(slots=True)
+class _WebhookContext:
+    """Services and per-message context shared by the intent handlers."""
+
+    chat_id: str
+    supabase_service: SupabaseService
+    council_service: CouncilService | None
+    gemini_service: GeminiService | None
+    container_status_service: ContainerStatusService | None
+    manager_gpt_service: ManagerGPTService | None
+    hazard_knowledge: HazardKnowledgeBase | None
+    topic_knowledge: TopicKnowledgeBase | None
+    semantic_cache: SemanticCache | None
+    scheduler: aiojobs.Scheduler
+    knowledge_sections: list[Mapping[str, str]] | None
+    conversation_history: list[dict] | None
+    # Metrics fetch started before the history/knowledge lookups, if any
+    metrics_task: asyncio.Task[Mapping[str, Any]] | None = None
+
+
+async def _handle_daily(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    target_date = intent.target_date
+    if not target_date:
+        return build_fallback_response()
+    count = await asyncio.to_thread(ctx.supabase_service.get_daily_containers_count, target_date)
+    return build_daily_containers_response(count, target_date)
+
+
+async def _handle_containers_range(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    start_date, end_date = intent.start_date, intent.end_date
+    if not (start_date and end_date):
+        return build_fallback_response()
+    count = await asyncio.to_thread(
+        ctx.supabase_service.get_containers_count_between, start_date, end_date
+    )
+    return build_containers_range_response(count, start_date, end_date)
+
+
+async def _handle_vehicles_range(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    start_date, end_date = intent.start_date, intent.end_date
+    if not (start_date and end_date):
+        return build_fallback_response()
+    count = await asyncio.to_thread(
+        ctx.supabase_service.get_vehicle_count_between, start_date, end_date
+    )
+    return build_vehicles_range_response(count, start_date, end_date)
+
+
+async def _handle_monthly(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    month, year = intent.month, intent.year
+    if not (month and year):
+        logger.warning("Missing month or year parameters for containers_count_monthly")
+        return build_fallback_response()
+    logger.debug("Fetching monthly containers: month=%d, year=%d", month, year)
+    count = await asyncio.to_thread(
+        ctx.supabase_service.get_containers_count_monthly, month, year
+    )
+    logger.debug("Monthly containers count result: %d", count)
+
+    # If count is 0, double-check with Council/Gemini (might be missing data or wrong date interpretation)
+    if count != 0 or not (ctx.council_service or ctx.gemini_service):
+        return build_monthly_containers_response(count, month, year)
+    verified_at = _zero_month_verified_at.get((month, year))
+    if verified_at is not None and time.monotonic() - verified_at < ZERO_MONTH_RECHECK_SECONDS:
+        logger.debug("Zero count for %d/%d already verified recently, skipping LLM re-check", month, year)
+        return build_monthly_containers_response(count, month, year)
+
+    logger.debug("Count is 0, verifying with Council/Gemini for month=%d, year=%d", month, year)
+    # Fetch extended metrics for the specific year, plus the knowledge and full
+    # history rows the webhook skipped for this intent
+    metrics, knowledge_sections, conversation_history = await asyncio.gather(
+        _get_year_metrics(ctx.supabase_service, year),
+        _combined_knowledge(ctx.hazard_knowledge, ctx.topic_knowledge, incoming_text),
+        asyncio.to_thread(
+            ctx.supabase_service.get_recent_user_queries,
+            user_phone=ctx.chat_id,
+            limit=MAX_CONVERSATION_HISTORY,
+            exclude_current=True,
+        ),
+    )
+    llm_response = await _llm_answer(
+        incoming_text,
+        metrics,
+        knowledge_sections,
+        conversation_history,
+        ctx.council_service,
+        ctx.gemini_service,
+    )
+    if llm_response and "לא מצאתי" not in llm_response and "חסר" not in llm_response.lower():
+        logger.debug("LLM found data, using LLM response")
+        return llm_response
+    logger.debug("LLM also found no data, using 0 count")
+    if llm_response:
+        # Only a real "no data" answer counts as verified; an LLM failure is retried
+        _zero_month_verified_at[(month, year)] = time.monotonic()
+    return build_monthly_containers_response(count, month, year)
+
+
+async def _handle_comparison(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    month1 = intent.parameters["month1"]
+    year1 = intent.parameters["year1"]
+    month2 = intent.parameters["month2"]
+    year2 = intent.parameters["year2"]
+    logger.debug(
+        "Fetching comparison: month1=%d, year1=%d vs month2=%d, year2=%d",
+        month1, year1, month2, year2
+    )
+    comparison = await asyncio.to_thread(
+        ctx.supabase_service.get_containers_count_comparison,
+        month1, year1, month2, year2,
+    )
+    logger.debug(
+        "Comparison result: %d vs %d (difference: %d)",
+        comparison["count1"], comparison["count2"], comparison["difference"]
+    )
+    return build_comparison_containers_response(
+        comparison["count1"], month1, year1,
+        comparison["count2"], month2, year2,
+        comparison["difference"],
+    )
+
+
+async def _handle_llm_analysis(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    if ctx.metrics_task:
+        metrics = await ctx.metrics_task
+    else:
+        metrics = await asyncio.to_thread(
+            ctx.supabase_service.get_metrics_summary,
+            start_date=intent.start_date,
+            end_date=intent.end_date,
+        )
+    return await _llm_answer(
+        incoming_text,
+        metrics,
+        ctx.knowledge_sections,
+        ctx.conversation_history,
+        ctx.council_service,
+        ctx.gemini_service,
+    ) or build_fallback_response()
+
+
+async def _handle_container_status(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    container_id = intent.container_id
+    if not container_id:
+        return build_fallback_response()
+    if not ctx.container_status_service:
+        return "שירות בדיקת הסטטוס אינו זמין כרגע."
+    logger.debug("Fetching container status for %s across all ports", container_id)
+    statuses = await ctx.container_status_service.lookup(container_id)
+    return build_container_status_response(container_id, statuses)
+
+
+async def _handle_manager(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    question = intent.question or incoming_text
+    if not ctx.manager_gpt_service:
+        logger.warning("Manager GPT service not available, using fallback")
+        return build_fallback_response()
+    lookup: SemanticLookup | None = None
+    if ctx.semantic_cache:
+        lookup = await ctx.semantic_cache.lookup(question, "manager_question")
+        if lookup.answer:
+            return lookup.answer
+    logger.debug("Routing manager question to Manager GPT: %s", question)
+    try:
+        async with _llm_slot(_gemini_semaphore, "Gemini"):
+            response_text = await ctx.manager_gpt_service.answer_manager_question(question)
+    except Exception as e:
+        logger.error("Error calling Manager GPT service: %s", e, exc_info=True)
+        return build_fallback_response()
+    if not response_text or not response_text.strip():
+        return build_fallback_response()
+    if lookup:
+        await ctx.scheduler.spawn(
+            ctx.semantic_cache.store(lookup, response_text, MANAGER_SEMANTIC_CACHE_TTL_SECONDS)
+        )
+    return response_text
+
+
+# Static parts of the QuickChart config for the monthly graph; only the
+# labels and data change per request. Never mutated, only referenced.
+_CHART_DATASET_STYLE: dict[str, Any] = {
+    "label": "מכולות לחודש (נמל אשדוד)",
+    "backgroundColor": "rgba(52, 152, 219, 0.7)",
+    "borderColor": "rgba(41, 128, 185, 1.0)",
+    "borderWidth": 1,
+}
+_CHART_OPTIONS: dict[str, Any] = {
+    "plugins": {
+        "title": {
+            "display": True,
+            "text": "כמות מכולות לפי חודש – שנה אחרונה (נמל אשדוד)",
+        },
+        "legend": {"display": False},
+    },
+    "scales": {
+        "x": {
+            "title": {"display": True, "text": "חודש"},
+        },
+        "y": {
+            "title": {"display": True, "text": "מספר מכולות"},
+            "beginAtZero": True,
+        },
+    },
+}
+
+
+async def _handle_monthly_graph(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    # Graph of containers per month – last year, Ashdod port (by KMUT over time)
+    logger.debug("Building monthly containers graph (last year, Ashdod, bar)")
+    series = await asyncio.to_thread(ctx.supabase_service.get_monthly_containers_series_last_year)
+    if not series:
+        return "לא הצלחתי לבנות גרף כרגע (אין נתונים חודשיים זמינים)."
+
+    # Prepare labels and data for QuickChart
+    labels = [f"{item['year']}-{item['month']:02d}" for item in series]
+    data = [int(item["count"] or 0) for item in series]
+
+    chart_config = {
+        "type": "bar",
+        "data": {
+            "labels": labels,
+            "datasets": [{**_CHART_DATASET_STYLE, "data": data}],
+        },
+        "options": _CHART_OPTIONS,
+    }
+
+    chart_url = (
+        "https://quickchart.io/chart?c="
+        + urllib.parse.quote(orjson.dumps(chart_config), safe="")
+    )
+
+    return (
+        "להלן גרף כמות המכולות לפי חודש בשנה האחרונה (נמל אשדוד):\n"
+        f"{chart_url}\n\n"
+        "אם הקישור לא נפתח, ניתן להעתיק אותו לדפדפן."
+    )
+
+
+async def _handle_procedure(intent: IntentResult, incoming_text: str, ctx: _WebhookContext) -> str:
+    # Questions about procedures / operational queue rules.
+    # ב-WhatsApp אי אפשר לפתוח אוטומטית את NotebookLM, לכן שולחים למשתמש הנחיה ברורה יחד עם הקישור והטקסט המדויק של השאלה.
+    question = intent.question or incoming_text
+    notebook_id = "66688b34-ca77-4097-8ac8-42ca8285681f"
+    notebook_url = f"https://notebooklm.google.com/notebook/{notebook_id}"
+
+    logger.debug(
+        "Procedure question detected, directing user to NotebookLM. Question: %s",
+        question,
+    )
+
+    return (
+        "זאת שאלה על נהלים / תור תפעולי ולכן מופנית ל‑NotebookLM, שבו נמצאים המסמכים המלאים.\n\n"
+        "כדי לקבל תשובה מדויקת:\n"
+        f"1. פתח את הקישור: {notebook_url}\n"
+        "2. הדבק שם את השאלה הבאה ושלח אותה:\n"
+        f"\"{question}\"\n"
+    )
+
+
+# Dispatch table keyed by IntentEngine intent names
+_INTENT_HANDLERS: dict[str, Callable[[IntentResult, str, _WebhookContext], Awaitable[str]]] = {
+    "daily_containers_count": _handle_daily,
+    "containers_count_between": _handle_containers_range,
+    "vehicles_count_between": _handle_vehicles_range,
+    "containers_count_monthly": _handle_monthly,
+    "containers_count_comparison": _handle_comparison,
+    "llm_analysis": _handle_llm_analysis,
+    "container_status_lookup": _handle_container_status,
+    "manager_question": _handle_manager,
+    "monthly_containers_graph": _handle_monthly_graph,
+    "procedure_question": _handle_procedure,
+}
 
 
 @router.post(
     "/webhook",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Handle incoming Green API webhook notifications",
+    responses={
+        status.HTTP_204_NO_CONTENT: {"description": "Notification ignored (not an incoming text message)"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Missing or invalid webhook token"},
+    },
 )
 async def handle_webhook(
-    payload: GreenWebhookPayload,
-    background_tasks: BackgroundTasks,
+    request: Request,
     intent_engine: IntentEngine = Depends(get_intent_engine),
     supabase_service: SupabaseService = Depends(get_supabase_service),
     green_api_client: GreenAPIClient = Depends(get_green_api_client),
@@ -245,39 +785,63 @@ async def handle_webhook(
     topic_knowledge: TopicKnowledgeBase | None = Depends(get_topic_knowledge),
     container_status_service: ContainerStatusService | None = Depends(get_container_status_service),
     manager_gpt_service: ManagerGPTService | None = Depends(get_manager_gpt_service),
+    response_cache: ResponseCache | None = Depends(get_response_cache),
+    semantic_cache: SemanticCache | None = Depends(get_semantic_cache),
+    scheduler: aiojobs.Scheduler = Depends(get_scheduler),
+    message_scheduler: aiojobs.Scheduler = Depends(get_message_scheduler),
+    query_log: QueryLogWriter | None = Depends(get_query_log),
     authorization: str | None = Header(default=None),
-    webhook_token: str | None = Depends(get_webhook_token),
 ) -> Response:
-    # Ensure datetime alias is available inside the function scope (avoids shadowing issues)
-    import datetime as dt
-
-    logger.info("=== WEBHOOK RECEIVED ===")
-    logger.info("Type: %s, HasAuth: %s, Timestamp: %s", 
-                getattr(payload, 'typeWebhook', 'unknown'),
-                authorization is not None,
-                getattr(payload, 'timestamp', 'unknown'))
+    # Per-request tracing is DEBUG-only; check once so the argument
+    # expressions (slices, previews) are skipped entirely when it is off.
+    debug_on = logger.isEnabledFor(logging.DEBUG)
+
+    # Green API sends many webhook types we ignore, so the body is decoded as
+    # plain JSON first (orjson) and only incoming messages pay for model validation.
+    try:
+        raw = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raw = None
+    if not isinstance(raw, dict):
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": "Expected a JSON object", "input": raw}]
+        )
+    type_webhook = raw.get("typeWebhook")
+
+    if debug_on:
+        logger.debug("=== WEBHOOK RECEIVED ===")
+        logger.debug("Type: %s, HasAuth: %s, Timestamp: %s",
+                     type_webhook or "unknown",
+                     authorization is not None,
+                     raw.get("timestamp", "unknown"))
     
-    if webhook_token:
+    if _AUTH_REQUIRED:
         if not authorization:
             logger.warning("Missing authorization header for webhook call")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-        logger.info("Authorization header received: %s", authorization[:50] + "..." if len(authorization) > 50 else authorization)
+        if debug_on:
+            logger.debug("Authorization header received (length %d)", len(authorization))
         scheme, _, token = authorization.partition(" ")
         provided = token if scheme.lower() == "bearer" else authorization.strip()
-        logger.info("Extracted token: %s (scheme: %s)", provided[:20] + "..." if len(provided) > 20 else provided, scheme)
-        if provided != webhook_token:
-            logger.warning("Invalid webhook token provided. Expected: %s, Got: %s", 
-                         webhook_token[:20] + "..." if len(webhook_token) > 20 else webhook_token,
-                         provided[:20] + "..." if len(provided) > 20 else provided)
+        if debug_on:
+            logger.debug("Extracted token (length %d, scheme: %s)", len(provided), scheme)
+        # Constant-time compare so response timing doesn't leak the token
+        if not hmac.compare_digest(provided.encode("utf-8"), _WEBHOOK_TOKEN_B):
+            logger.warning("Rejected webhook token (length %d)", len(provided))
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-        logger.info("Authorization successful")
+        logger.debug("Authorization successful")
 
     # Only process incomingMessageReceived webhooks
-    if payload.typeWebhook != "incomingMessageReceived":
-        logger.info("Ignoring webhook type: %s (not incomingMessageReceived)", payload.typeWebhook)
+    if type_webhook != "incomingMessageReceived":
+        logger.info("Ignoring webhook type: %s (not incomingMessageReceived)", type_webhook)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    try:
+        payload = GreenWebhookPayload.model_validate(raw)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False)) from e
     
-    logger.info("Processing incomingMessageReceived webhook")
+    logger.debug("Processing incomingMessageReceived webhook")
 
     # Validate that we have the required fields for incoming messages
     if not payload.messageData or not payload.senderData:
@@ -285,8 +849,7 @@ async def handle_webhook(
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     # Support both textMessage and extendedTextMessage (both contain text in textMessageData)
-    message_type_lower = payload.messageData.typeMessage.lower()
-    if message_type_lower not in ("textmessage", "extendedtextmessage"):
+    if payload.messageData.typeMessage not in _TEXT_MESSAGE_TYPES:
         logger.info("Ignoring non-text message (type=%s)", payload.messageData.typeMessage)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -296,347 +859,287 @@ async def handle_webhook(
         logger.warning("Received text message with no text payload for chat %s", chat_id)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+    await message_scheduler.spawn(
+        _process_message(
+            chat_id=chat_id,
+            incoming_text=incoming_text,
+            intent_engine=intent_engine,
+            supabase_service=supabase_service,
+            green_api_client=green_api_client,
+            gemini_service=gemini_service,
+            council_service=council_service,
+            hazard_knowledge=hazard_knowledge,
+            topic_knowledge=topic_knowledge,
+            container_status_service=container_status_service,
+            manager_gpt_service=manager_gpt_service,
+            response_cache=response_cache,
+            semantic_cache=semantic_cache,
+            scheduler=scheduler,
+            query_log=query_log,
+        )
+    )
+    return Response(status_code=status.HTTP_202_ACCEPTED)
+
+
+async def _process_message(
+    *,
+    chat_id: str,
+    incoming_text: str,
+    green_api_client: GreenAPIClient,
+    scheduler: aiojobs.Scheduler,
+    query_log: QueryLogWriter | None,
+    **services: Any,
+) -> None:
+    """
+    Message-scheduler job: answer one message, replying with the fallback on failure.
+
+    The webhook has already returned 202, so an exception here would not make
+    Green API retry; without this the user would get no reply and no log row.
+    """
+    try:
+        await _answer_message(
+            chat_id=chat_id,
+            incoming_text=incoming_text,
+            green_api_client=green_api_client,
+            scheduler=scheduler,
+            query_log=query_log,
+            **services,
+        )
+    except Exception as e:
+        logger.error("Failed to answer message from %s: %s", chat_id, e, exc_info=True)
+        await scheduler.spawn(
+            send_message_with_error_handling(
+                green_api_client,
+                chat_id,
+                build_fallback_response(),
+                query_log,
+                incoming_text,
+                None,
+                NO_PARAMETERS,
+            )
+        )
+
+
+async def _answer_message(
+    *,
+    chat_id: str,
+    incoming_text: str,
+    intent_engine: IntentEngine,
+    supabase_service: SupabaseService,
+    green_api_client: GreenAPIClient,
+    gemini_service: GeminiService | None,
+    council_service: CouncilService | None,
+    hazard_knowledge: HazardKnowledgeBase | None,
+    topic_knowledge: TopicKnowledgeBase | None,
+    container_status_service: ContainerStatusService | None,
+    manager_gpt_service: ManagerGPTService | None,
+    response_cache: ResponseCache | None,
+    semantic_cache: SemanticCache | None,
+    scheduler: aiojobs.Scheduler,
+    query_log: QueryLogWriter | None,
+) -> None:
+    """
+    Answer one incoming text message and queue the reply.
+
+    Runs inside a message-scheduler job after the webhook has returned 202, so
+    Green API never waits on Supabase, the knowledge bases or an LLM.
+    """
+    debug_on = logger.isEnabledFor(logging.DEBUG)
+
     # Map short template codes (like {{SWE001}}) to full user-facing questions
     original_text = incoming_text
-    mapped_text = SWE_TEMPLATE_MAP.get(incoming_text.strip())
+    template_code = incoming_text.strip()
+    mapped_text = SWE_TEMPLATE_MAP.get(template_code)
     if mapped_text:
-        logger.info("Mapped template code '%s' to full question: %s", original_text, mapped_text)
+        logger.debug("Mapped template code '%s' to full question: %s", original_text, mapped_text)
         incoming_text = mapped_text
 
-    logger.info("Received message from %s: %s", chat_id, incoming_text)
-    intent: IntentResult | None = intent_engine.match(incoming_text)
-    logger.info("Intent matched: %s (parameters: %s)", intent.name if intent else "None", intent.parameters if intent else "None")
-    
-    # Get conversation history for context
-    conversation_history = supabase_service.get_recent_user_queries(
+    logger.debug("Received message from %s: %s", chat_id, incoming_text)
+    intent: IntentResult | None = SWE_INTENT_MAP.get(template_code) or match_intent(intent_engine, incoming_text)
+    if debug_on and intent:
+        logger.debug("Intent matched: %s (parameters: %s)", intent.name, dict(intent.parameters))
+
+    # Free-text questions and llm_analysis need the metrics summary for the
+    # LLM. Unless the answer is already cached, start that fetch (and the
+    # similar-question lookup) now so it overlaps with the history and
+    # knowledge lookups below. Other intents never touch the summary.
+    cached_answer: str | None = None
+    metrics_task: asyncio.Task[Mapping[str, Any]] | None = None
+    semantic_task: asyncio.Task[SemanticLookup] | None = None
+    if not intent:
+        if response_cache:
+            cached_answer = await response_cache.get(chat_id, incoming_text)
+        if not cached_answer and semantic_cache:
+            # Answers depend on today's metrics and on this chat's history, so
+            # matches never cross days or chats
+            semantic_task = asyncio.create_task(
+                semantic_cache.lookup(
+                    incoming_text, f"free_text:{chat_id}:{dt.date.today().isoformat()}"
+                )
+            )
+        if not cached_answer and (council_service or gemini_service):
+            metrics_end_date = dt.date.today()
+            metrics_start_date = dt.date(metrics_end_date.year - DEFAULT_METRICS_YEARS_BACK, 1, 1)
+            metrics_task = asyncio.create_task(
+                asyncio.to_thread(
+                    supabase_service.get_metrics_summary,
+                    start_date=metrics_start_date,
+                    end_date=metrics_end_date,
+                    max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
+                )
+            )
+    elif intent.name == "llm_analysis" and (council_service or gemini_service):
+        metrics_task = asyncio.create_task(
+            asyncio.to_thread(
+                supabase_service.get_metrics_summary,
+                start_date=intent.start_date,
+                end_date=intent.end_date,
+            )
+        )
+
+    # Conversation history and both knowledge lookups are independent, so they
+    # run concurrently. SupabaseService is blocking; its calls go through a
+    # worker thread so concurrent webhooks are not serialized on the event loop.
+    # Knowledge and full history rows are only fetched for branches that always
+    # hand them to an LLM; other intents just need created_at for the greeting
+    # (the monthly zero-count re-check loads its own context).
+    needs_llm_context = intent is None or intent.name in _LLM_CONTEXT_INTENTS
+    history_call = asyncio.to_thread(
+        supabase_service.get_recent_user_queries,
         user_phone=chat_id,
         limit=MAX_CONVERSATION_HISTORY,
         exclude_current=True,
+        fields=None if needs_llm_context else _GREETING_HISTORY_FIELDS,
     )
+    try:
+        if needs_llm_context:
+            conversation_history, combined_knowledge = await asyncio.gather(
+                history_call,
+                _combined_knowledge(hazard_knowledge, topic_knowledge, incoming_text),
+            )
+        else:
+            conversation_history, combined_knowledge = await history_call, None
+    except BaseException:
+        for task in (metrics_task, semantic_task):
+            if task:
+                task.cancel()
+        raise
     if conversation_history:
-        logger.info("Retrieved %d previous queries for context", len(conversation_history))
-    
-    # Get knowledge sections from both hazard and topic knowledge bases
-    hazard_sections = (
-        hazard_knowledge.build_sections(incoming_text)
-        if hazard_knowledge and hazard_knowledge.is_available()
-        else None
-    )
-    
-    topic_sections = (
-        topic_knowledge.build_sections(incoming_text)
-        if topic_knowledge and topic_knowledge.is_available()
-        else None
-    )
-    
-    # Combine knowledge sections (hazard first, then topic)
-    knowledge_sections = []
-    if hazard_sections:
-        knowledge_sections.extend(hazard_sections)
-    if topic_sections:
-        knowledge_sections.extend(topic_sections)
-    
-    # Use None if empty to maintain compatibility
-    combined_knowledge = knowledge_sections if knowledge_sections else None
+        logger.debug("Retrieved %d previous queries for context", len(conversation_history))
 
     if not intent:
-        logger.info("No intent matched, using Council/Gemini or fallback")
-        # Prefer Council service (multi-model with ranking) over Gemini
-        end_date = dt.date.today()
-        start_date = dt.date(end_date.year - DEFAULT_METRICS_YEARS_BACK, 1, 1)
-        metrics = supabase_service.get_metrics_summary(
-            start_date=start_date,
-            end_date=end_date,
-            max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
-        )
-        
-        try:
-            if council_service:
-                logger.info("Council service available, fetching metrics and using multi-model approach...")
-                logger.info("Metrics fetched (period: %s to %s), calling Council with question: %s", 
-                           start_date.isoformat(), end_date.isoformat(), incoming_text)
-                response_text = await council_service.answer_question(
-                    question=incoming_text,
-                    metrics=metrics,
-                    knowledge_sections=combined_knowledge,
-                    conversation_history=conversation_history,
+        logger.debug("No intent matched, using Council/Gemini or fallback")
+        semantic_lookup = await semantic_task if semantic_task else None
+        if semantic_lookup and semantic_lookup.answer:
+            cached_answer = semantic_lookup.answer
+            if metrics_task:
+                metrics_task.cancel()
+        if cached_answer:
+            response_text = _maybe_prefix_greeting(cached_answer, conversation_history)
+            await scheduler.spawn(
+                send_message_with_error_handling(
+                    green_api_client,
+                    chat_id,
+                    response_text,
+                    query_log,
+                    incoming_text,
+                    None,
+                    NO_PARAMETERS,
                 )
-                logger.info("Council response: %s", response_text[:200] if response_text else "None")
-                if not response_text or not response_text.strip():
-                    logger.warning("Council returned empty response, using fallback")
-                    response_text = build_fallback_response()
-            elif gemini_service:
-                logger.info("Council service not available, using Gemini service...")
-                logger.info("Metrics fetched (period: %s to %s), calling Gemini with question: %s", 
-                           start_date.isoformat(), end_date.isoformat(), incoming_text)
-                response_text = await gemini_service.answer_question(
-                    question=incoming_text,
-                    metrics=metrics,
-                    knowledge_sections=combined_knowledge,
-                    conversation_history=conversation_history,
+            )
+            logger.info("Reply queued for %s (intent=none, source=cache)", chat_id)
+            return
+
+        llm_answer = None
+        if metrics_task:
+            metrics = await metrics_task
+            if debug_on:
+                logger.debug("Metrics fetched (period: %s to %s), calling LLM with question: %s",
+                             metrics_start_date.isoformat(), metrics_end_date.isoformat(), incoming_text)
+            llm_answer = await _llm_answer(
+                incoming_text,
+                metrics,
+                combined_knowledge,
+                conversation_history,
+                council_service,
+                gemini_service,
+            )
+        else:
+            logger.debug("Neither Council nor Gemini service available, using fallback")
+        if llm_answer:
+            if debug_on:
+                logger.debug("LLM response: %s", _trunc(llm_answer, 200))
+            # Only real answers are cached; fallbacks should be retried next time
+            if response_cache:
+                await response_cache.set(chat_id, incoming_text, llm_answer)
+            if semantic_lookup:
+                await scheduler.spawn(
+                    semantic_cache.store(semantic_lookup, llm_answer, FREE_TEXT_SEMANTIC_CACHE_TTL_SECONDS)
                 )
-                logger.info("Gemini response: %s", response_text[:200] if response_text else "None")
-                if not response_text or not response_text.strip():
-                    logger.warning("Gemini returned empty response, using fallback")
-                    response_text = build_fallback_response()
-            else:
-                logger.info("Neither Council nor Gemini service available, using fallback")
-                response_text = build_fallback_response()
-        except Exception as e:
-            logger.error("Error calling LLM service: %s", e, exc_info=True)
-            response_text = build_fallback_response()
-        
-        # Ensure we always have a response
-        if not response_text or not response_text.strip():
-            logger.warning("Response is empty after all attempts, using fallback")
+            response_text = llm_answer
+        else:
             response_text = build_fallback_response()
 
         # Add greeting prefix if this is a new conversation
         response_text = _maybe_prefix_greeting(response_text, conversation_history)
         
-        background_tasks.add_task(
-            send_message_with_error_handling,
-            green_api_client,
-            chat_id,
-            response_text,
-            supabase_service,
-            incoming_text,
-            None,
-            {},
-        )
-        return Response(status_code=status.HTTP_202_ACCEPTED)
-
-    if intent.name == "daily_containers_count":
-        target_date = intent.parameters["target_date"]
-        count = supabase_service.get_daily_containers_count(target_date)
-        response_text = build_daily_containers_response(count, target_date)
-    elif intent.name == "containers_count_between":
-        start_date = intent.parameters["start_date"]
-        end_date = intent.parameters["end_date"]
-        count = supabase_service.get_containers_count_between(start_date, end_date)
-        response_text = build_containers_range_response(count, start_date, end_date)
-    elif intent.name == "vehicles_count_between":
-        start_date = intent.parameters["start_date"]
-        end_date = intent.parameters["end_date"]
-        count = supabase_service.get_vehicle_count_between(start_date, end_date)
-        response_text = build_vehicles_range_response(count, start_date, end_date)
-    elif intent.name == "containers_count_monthly":
-        month = intent.parameters["month"]
-        year = intent.parameters["year"]
-        logger.info("Fetching monthly containers: month=%d, year=%d", month, year)
-        count = supabase_service.get_containers_count_monthly(month, year)
-        logger.info("Monthly containers count result: %d", count)
-        
-        # If count is 0, double-check with Council/Gemini (might be missing data or wrong date interpretation)
-        if count == 0 and (council_service or gemini_service):
-            logger.info("Count is 0, verifying with Council/Gemini for month=%d, year=%d", month, year)
-            import datetime as dt
-            # Fetch extended metrics for the specific year
-            start_date = dt.date(year, 1, 1)
-            end_date = dt.date(year, 12, 31)
-            metrics = supabase_service.get_metrics_summary(
-                start_date=start_date,
-                end_date=end_date,
-                max_rows=DEFAULT_MAX_ROWS_FOR_LLM,
+        await scheduler.spawn(
+            send_message_with_error_handling(
+                green_api_client,
+                chat_id,
+                response_text,
+                query_log,
+                incoming_text,
+                None,
+                NO_PARAMETERS,
             )
-            
-            # Prefer Council over Gemini
-            if council_service:
-                llm_response = await council_service.answer_question(
-                    question=incoming_text,
-                    metrics=metrics,
-                    knowledge_sections=combined_knowledge,
-                    conversation_history=conversation_history,
-                )
-            else:
-                llm_response = await gemini_service.answer_question(
-                    question=incoming_text,
-                    metrics=metrics,
-                    knowledge_sections=combined_knowledge,
-                    conversation_history=conversation_history,
-                )
-            
-            if llm_response and "לא מצאתי" not in llm_response and "חסר" not in llm_response.lower():
-                logger.info("LLM found data, using LLM response")
-                response_text = llm_response
-            else:
-                logger.info("LLM also found no data, using 0 count")
-                response_text = build_monthly_containers_response(count, month, year)
-        else:
-            response_text = build_monthly_containers_response(count, month, year)
-    elif intent.name == "containers_count_comparison":
-        month1 = intent.parameters["month1"]
-        year1 = intent.parameters["year1"]
-        month2 = intent.parameters["month2"]
-        year2 = intent.parameters["year2"]
-        logger.info(
-            "Fetching comparison: month1=%d, year1=%d vs month2=%d, year2=%d",
-            month1, year1, month2, year2
-        )
-        comparison = supabase_service.get_containers_count_comparison(
-            month1, year1, month2, year2
         )
         logger.info(
-            "Comparison result: %d vs %d (difference: %d)",
-            comparison["count1"], comparison["count2"], comparison["difference"]
-        )
-        response_text = build_comparison_containers_response(
-            comparison["count1"], month1, year1,
-            comparison["count2"], month2, year2,
-            comparison["difference"],
-        )
-        logger.info("Response text: %s", response_text)
-    elif intent.name == "llm_analysis":
-        start_date = intent.parameters.get("start_date")
-        end_date = intent.parameters.get("end_date")
-        metrics = supabase_service.get_metrics_summary(
-            start_date=start_date,
-            end_date=end_date,
-        )
-        
-        # Prefer Council over Gemini
-        if council_service:
-            response_text = await council_service.answer_question(
-                question=incoming_text,
-                metrics=metrics,
-                knowledge_sections=combined_knowledge,
-                conversation_history=conversation_history,
-            )
-        elif gemini_service:
-            response_text = await gemini_service.answer_question(
-                question=incoming_text,
-                metrics=metrics,
-                knowledge_sections=combined_knowledge,
-                conversation_history=conversation_history,
-            )
-        else:
-            response_text = build_fallback_response()
-        
-        if not response_text:
-            response_text = build_fallback_response()
-    elif intent.name == "container_status_lookup":
-        container_id = str(intent.parameters["container_id"])
-        if not container_status_service:
-            response_text = "שירות בדיקת הסטטוס אינו זמין כרגע."
-        else:
-            logger.info("Fetching container status for %s across all ports", container_id)
-            statuses = await container_status_service.lookup(container_id)
-            response_text = build_container_status_response(container_id, statuses)
-    elif intent.name == "manager_question":
-        question = str(intent.parameters["question"])
-        if not manager_gpt_service:
-            logger.warning("Manager GPT service not available, using fallback")
-            response_text = build_fallback_response()
-        else:
-            logger.info("Routing manager question to Manager GPT: %s", question)
-            try:
-                response_text = await manager_gpt_service.answer_manager_question(question)
-                if not response_text or not response_text.strip():
-                    response_text = build_fallback_response()
-            except Exception as e:
-                logger.error("Error calling Manager GPT service: %s", e, exc_info=True)
-                response_text = build_fallback_response()
-    elif intent.name == "monthly_containers_graph":
-        # Graph of containers per month – last year, Ashdod port (by KMUT over time)
-        logger.info("Building monthly containers graph (last year, Ashdod, bar)")
-        series = supabase_service.get_monthly_containers_series_last_year()
-        if not series:
-            response_text = "לא הצלחתי לבנות גרף כרגע (אין נתונים חודשיים זמינים)."
-        else:
-            # Prepare labels and data for QuickChart
-            labels = [f"{item['year']}-{item['month']:02d}" for item in series]
-            data = [int(item["count"] or 0) for item in series]
-
-            chart_config = {
-                "type": "bar",
-                "data": {
-                    "labels": labels,
-                    "datasets": [
-                        {
-                            "label": "מכולות לחודש (נמל אשדוד)",
-                            "data": data,
-                            "backgroundColor": "rgba(52, 152, 219, 0.7)",
-                            "borderColor": "rgba(41, 128, 185, 1.0)",
-                            "borderWidth": 1,
-                        }
-                    ],
-                },
-                "options": {
-                    "plugins": {
-                        "title": {
-                            "display": True,
-                            "text": "כמות מכולות לפי חודש – שנה אחרונה (נמל אשדוד)",
-                        },
-                        "legend": {"display": False},
-                    },
-                    "scales": {
-                        "x": {
-                            "title": {"display": True, "text": "חודש"},
-                        },
-                        "y": {
-                            "title": {"display": True, "text": "מספר מכולות"},
-                            "beginAtZero": True,
-                        },
-                    },
-                },
-            }
-
-            import json, urllib.parse
-
-            chart_url = (
-                "https://quickchart.io/chart?c="
-                + urllib.parse.quote(json.dumps(chart_config), safe="")
-            )
-
-            response_text = (
-                "להלן גרף כמות המכולות לפי חודש בשנה האחרונה (נמל אשדוד):\n"
-                f"{chart_url}\n\n"
-                "אם הקישור לא נפתח, ניתן להעתיק אותו לדפדפן."
-            )
-    elif intent.name == "procedure_question":
-        # Questions about procedures / operational queue rules.
-        # ב-WhatsApp אי אפשר לפתוח אוטומטית את NotebookLM, לכן שולחים למשתמש הנחיה ברורה יחד עם הקישור והטקסט המדויק של השאלה.
-        question = str(intent.parameters.get("question") or incoming_text)
-        notebook_id = "66688b34-ca77-4097-8ac8-42ca8285681f"
-        notebook_url = f"https://notebooklm.google.com/notebook/{notebook_id}"
-
-        logger.info(
-            "Procedure question detected, directing user to NotebookLM. Question: %s",
-            question,
-        )
-
-        response_text = (
-            "זאת שאלה על נהלים / תור תפעולי ולכן מופנית ל‑NotebookLM, שבו נמצאים המסמכים המלאים.\n\n"
-            "כדי לקבל תשובה מדויקת:\n"
-            f"1. פתח את הקישור: {notebook_url}\n"
-            "2. הדבק שם את השאלה הבאה ושלח אותה:\n"
-            f"\"{question}\"\n"
-        )
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Intent not implemented"
+            "Reply queued for %s (intent=none, source=%s)", chat_id, "llm" if llm_answer else "fallback"
         )
+        return
+
+    handler = _INTENT_HANDLERS.get(intent.name)
+    if handler is None:
+        logger.error("No handler for intent %s; dropping message from %s", intent.name, chat_id)
+        return
+    ctx = _WebhookContext(
+        chat_id=chat_id,
+        supabase_service=supabase_service,
+        council_service=council_service,
+        gemini_service=gemini_service,
+        container_status_service=container_status_service,
+        manager_gpt_service=manager_gpt_service,
+        hazard_knowledge=hazard_knowledge,
+        topic_knowledge=topic_knowledge,
+        semantic_cache=semantic_cache,
+        scheduler=scheduler,
+        knowledge_sections=combined_knowledge,
+        conversation_history=conversation_history,
+        metrics_task=metrics_task,
+    )
+    response_text = await handler(intent, incoming_text, ctx)
 
     # Add greeting prefix if this is a new conversation
     response_text = _maybe_prefix_greeting(response_text, conversation_history)
 
-    logger.info("=== PREPARING RESPONSE ===")
-    logger.info("Chat ID: %s, Response length: %d chars", chat_id, len(response_text))
-    logger.info("Response preview: %s", response_text[:150])
+    if debug_on:
+        logger.debug("=== PREPARING RESPONSE ===")
+        logger.debug("Chat ID: %s, Response length: %d chars", chat_id, len(response_text))
+        logger.debug("Response preview: %s", _trunc(response_text, 150))
     
     # Queue message with proper error handling (logging happens inside the function)
-    background_tasks.add_task(
-        send_message_with_error_handling,
-        green_api_client,
-        chat_id,
-        response_text,
-        supabase_service,
-        incoming_text,
-        intent.name,
-        dict(intent.parameters),
+    await scheduler.spawn(
+        send_message_with_error_handling(
+            green_api_client,
+            chat_id,
+            response_text,
+            query_log,
+            incoming_text,
+            intent.name,
+            intent.parameters,
+        )
     )
-    logger.info("Message queued for sending to %s", chat_id)
-    
-    logger.info("=== WEBHOOK PROCESSING COMPLETE ===")
-    return Response(status_code=status.HTTP_202_ACCEPTED)
+    logger.info("Reply queued for %s (intent=%s)", chat_id, intent.name)
+    logger.debug("=== WEBHOOK PROCESSING COMPLETE ===")
 
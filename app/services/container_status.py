@@ -5,13 +5,70 @@ Utility service to query container status pages across all Israeli ports in para
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
-from dataclasses import dataclass
-from typing import Any, Sequence
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Sequence, TypeVar
+from urllib.parse import quote
 
 import httpx
-from bs4 import BeautifulSoup
+import lxml.etree
+import orjson
+
+CACHE_TTL_SECONDS = 20
+CACHE_KEY_PREFIX = "cstatus:"
+STALE_KEY_PREFIX = "cstatus:stale:"
+MAX_LOCAL_CACHE_ENTRIES = 512
+STALE_SUMMARY_NOTE = " (נתונים שמורים מבדיקה קודמת)"
+SYNC_FETCH_THREADS = 16
+# Per-request deadline so one hung site does not hold the whole reply for the
+# full client timeout; the other ports' answers are returned as they are.
+PORT_TIMEOUT_SECONDS = 5.0
+# Ashdod may try the async client, the sync client and a fresh session in turn,
+# each under PORT_TIMEOUT_SECONDS, so its overall budget covers all three.
+ASHDOD_TIMEOUT_SECONDS = 3 * PORT_TIMEOUT_SECONDS
+ASHDOD_MAX_EVENTS = 5
+# After this many consecutive WAF rejections of the async client, Ashdod lookups
+# skip it for ASHDOD_BREAKER_SECONDS and go straight to the sync fallbacks.
+ASHDOD_BREAKER_THRESHOLD = 3
+ASHDOD_BREAKER_SECONDS = 60.0
+ASHDOD_PARSE_CHUNK_CHARS = 16 * 1024
+# One pull parser per thread, reset with close() after every page, so each
+# parse skips creating a new libxml2 parser context.
+_ASHDOD_PARSERS = threading.local()
+
+_T = TypeVar("_T")
+
+# Order matches the fetch tasks in ContainerStatusService._lookup_ports
+_PORT_NAMES: tuple[str, ...] = ("נמל אשדוד", "נמל חיפה", "נמל הדרום", "נמל המפרץ")
+_TIMEOUT_SUMMARY = "האתר לא הגיב בזמן. אנא נסה שוב מאוחר יותר."
+_INTERNAL_ERROR_SUMMARY = "שגיאה פנימית בזמן בדיקת הסטטוס."
+# Statuses the Ashdod site answers bot traffic with; retried through the sync fallbacks
+_ASHDOD_RETRY_STATUSES = frozenset({403, 429, 503})
+_HAIFA_LABEL_MAP: Mapping[str, str] = MappingProxyType(
+    {
+        "ContainerId": "מספר מכולה",
+        "Category": "סיווג",
+        "FreightKind": "סוג טעינה",
+        "ContainerType": "סוג מכולה",
+        "GrossWeight": "משקל ברוטו",
+        "TimeFacilityIn": "תאריך כניסה",
+        "TimeFacilityOut": "תאריך יציאה",
+        "StorageCode": "קוד אחסנה",
+        "LineOperator": "חברת קו",
+        "ShippingAgentName": "סוכן אוניה",
+        "CustomsAgentName": "סוכן מכס",
+        "InboundMode": "מצב כניסה",
+        "OutboundMode": "מצב יציאה",
+        "InboundVesselName": "שם אוניה נכנסת",
+        "OutboundVesselName": "שם אוניה יוצאת",
+        "AppointmentTruckingCompanyName": "חברת הובלה",
+    }
+)
 
 
 @dataclass(slots=True)
@@ -38,6 +95,13 @@ class ContainerStatusService:
     HAIFA_AJAX_URL = "https://www.haifaport.co.il/wp-admin/admin-ajax.php"
     HADEROM_API = "https://hadct.co.il/Controls/60/Public/SearchApiHandler.ashx"
     BAYPORT_API = "https://customer.sipgbayport.com/customer-service/itos/query-container-info"
+    # Query strings with constant keys; only the (quoted) container id is filled in
+    _ASHDOD_STATUS_URL = ASHDOD_URL + "?MISMHOLA={}"
+    _HADEROM_SEARCH_URL = HADEROM_API + "?action=search&type=container&id={}"
+    # (name, url) per port, in the order _lookup_ports fetches them
+    _PORTS = tuple(
+        zip(_PORT_NAMES, (ASHDOD_URL, HAIFA_AJAX_URL, HADEROM_API, BAYPORT_API), strict=True)
+    )
 
     CHROME_UA = (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -45,107 +109,316 @@ class ContainerStatusService:
         "Chrome/120.0.0.0 Safari/537.36"
     )
 
-    ASHDOD_HEADERS = {
-        "User-Agent": CHROME_UA,
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Referer": "https://www.ashdodport.co.il/",
-        "Origin": "https://www.ashdodport.co.il",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "same-origin",
-        "Sec-Fetch-User": "?1",
-        "Cache-Control": "max-age=0",
-    }
+    # Set on every client; the per-port header sets below only add to these.
+    COMMON_HEADERS: Mapping[str, str] = MappingProxyType(
+        {
+            "User-Agent": CHROME_UA,
+            "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7",
+        }
+    )
 
-    HAIFA_HEADERS = {
-        "User-Agent": CHROME_UA,
-        "Referer": "https://www.haifaport.co.il/container-status/",
-        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7",
-        "X-Requested-With": "XMLHttpRequest",
-        "Origin": "https://www.haifaport.co.il",
-        "Accept-Encoding": "gzip, deflate, br",
-    }
-    HADEROM_HEADERS = {
-        "User-Agent": CHROME_UA,
-        "Accept": "application/json",
-    }
-    BAYPORT_HEADERS = {
-        "User-Agent": CHROME_UA,
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
+    ASHDOD_REQUEST_HEADERS: Mapping[str, str] = MappingProxyType(
+        {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Referer": "https://www.ashdodport.co.il/",
+            "Origin": "https://www.ashdodport.co.il",
+            "Connection": "keep-alive",
+            "Upgrade-Insecure-Requests": "1",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "same-origin",
+            "Sec-Fetch-User": "?1",
+            "Cache-Control": "max-age=0",
+        }
+    )
+    # Full header sets for the dedicated sync clients
+    ASHDOD_HEADERS: Mapping[str, str] = MappingProxyType(
+        {**COMMON_HEADERS, **ASHDOD_REQUEST_HEADERS}
+    )
+    HAIFA_HEADERS: Mapping[str, str] = MappingProxyType(
+        {
+            **COMMON_HEADERS,
+            "Referer": "https://www.haifaport.co.il/container-status/",
+            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "X-Requested-With": "XMLHttpRequest",
+            "Origin": "https://www.haifaport.co.il",
+            "Accept-Encoding": "gzip, deflate, br",
+        }
+    )
+    HADEROM_HEADERS: Mapping[str, str] = MappingProxyType({"Accept": "application/json"})
+    BAYPORT_HEADERS: Mapping[str, str] = MappingProxyType(
+        {"Accept": "application/json", "Content-Type": "application/json"}
+    )
 
-    def __init__(self, timeout_seconds: float = 20.0) -> None:
+    def __init__(
+        self,
+        timeout_seconds: float = 20.0,
+        redis_url: str | None = None,
+        cache_ttl_seconds: int = CACHE_TTL_SECONDS,
+        sync_fetch_threads: int = SYNC_FETCH_THREADS,
+        port_timeout_seconds: float = PORT_TIMEOUT_SECONDS,
+        ashdod_timeout_seconds: float = ASHDOD_TIMEOUT_SECONDS,
+    ) -> None:
         self._timeout = timeout_seconds
+        self._port_timeout = min(port_timeout_seconds, timeout_seconds)
+        self._ashdod_timeout = max(ashdod_timeout_seconds, self._port_timeout)
         self._logger = logging.getLogger(__name__)
+        # The sync Haifa/Ashdod fetches get their own threads so they never queue
+        # behind other asyncio.to_thread users (e.g. Supabase calls) in the default pool.
+        self._executor = ThreadPoolExecutor(
+            max_workers=sync_fetch_threads, thread_name_prefix="cstatus"
+        )
+        # Created on first use from the executor threads and reused after that.
+        self._sync_clients_lock = threading.Lock()
+        self._haifa_sync_client: httpx.Client | None = None
+        self._ashdod_sync_client: httpx.Client | None = None
+        self._warmup_task: asyncio.Task[None] | None = None
+        self._ashdod_async_failures = 0
+        self._ashdod_async_blocked_until = 0.0
+        self._cache_ttl = cache_ttl_seconds
+        # Fallback when Redis is not configured; stale entries are kept without expiry.
+        self._local_cache: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._redis = None
+        if redis_url:
+            from redis import asyncio as redis_asyncio
+
+            self._redis = redis_asyncio.Redis.from_url(
+                redis_url,
+                max_connections=10,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5,
+            )
+        # Shared across lookups so the keep-alive pool to each port host is reused
+        # instead of paying a TCP+TLS handshake per host on every webhook.
+        self._client = httpx.AsyncClient(
+            timeout=timeout_seconds,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            headers=self.COMMON_HEADERS,
+        )
+
+    def start(self) -> None:
+        """Resolve the port hosts in the background so the first lookup skips DNS."""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(
+                self._resolve_port_hosts(), name="container-status-dns-warmup"
+            )
+
+    async def _resolve_port_hosts(self) -> None:
+        loop = asyncio.get_running_loop()
+        hosts = {httpx.URL(url).host for _, url in self._PORTS}
+        results = await asyncio.gather(
+            *(loop.getaddrinfo(host, 443) for host in hosts), return_exceptions=True
+        )
+        for host, result in zip(hosts, results, strict=True):
+            if isinstance(result, Exception):
+                self._logger.warning("DNS warm-up failed for %s: %s", host, result)
+
+    async def close(self) -> None:
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        await self._client.aclose()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._sync_clients_lock:
+            for sync_client in (self._haifa_sync_client, self._ashdod_sync_client):
+                if sync_client is not None:
+                    sync_client.close()
+            self._haifa_sync_client = self._ashdod_sync_client = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def _get_haifa_sync_client(self) -> httpx.Client:
+        # The client's cookie jar keeps whatever the WordPress bot wall sets on the
+        # first response, so later admin-ajax POSTs are sent with it.
+        with self._sync_clients_lock:
+            if self._haifa_sync_client is None:
+                # Threads cannot be cancelled, so the request itself gives up at the deadline
+                self._haifa_sync_client = httpx.Client(
+                    timeout=self._port_timeout,
+                    follow_redirects=True,
+                    headers=self.HAIFA_HEADERS,
+                    limits=httpx.Limits(max_keepalive_connections=4),
+                )
+            return self._haifa_sync_client
+
+    def _get_ashdod_sync_client(self) -> httpx.Client:
+        with self._sync_clients_lock:
+            if self._ashdod_sync_client is None:
+                self._ashdod_sync_client = httpx.Client(
+                    headers=self.ASHDOD_HEADERS,
+                    timeout=self._port_timeout,
+                    follow_redirects=True,
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=4),
+                )
+            return self._ashdod_sync_client
+
+    async def _run_sync(self, func: Callable[..., _T], *args: Any) -> _T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
 
     async def lookup(self, container_id: str) -> list[PortStatusResult]:
+        """
+        Return the status of a container at every port, served from a short-lived cache.
+
+        Ports whose site fails are answered from the last successful lookup of the
+        same container, when there is one, instead of an error.
+        """
+        container_key = container_id.strip().upper()
+        cached = await self._cache_get(CACHE_KEY_PREFIX + container_key)
+        if cached is not None:
+            return cached
+
+        results = await self._lookup_ports(container_id)
+        if any(self._is_upstream_failure(result) for result in results):
+            stale = await self._cache_get(STALE_KEY_PREFIX + container_key)
+            if stale is not None:
+                results = self._merge_stale(container_id, results, stale)
+
+        await self._cache_set(CACHE_KEY_PREFIX + container_key, results, self._cache_ttl)
+        if any(result.success for result in results):
+            await self._cache_set(STALE_KEY_PREFIX + container_key, results, None)
+        return results
+
+    async def _lookup_ports(self, container_id: str) -> list[PortStatusResult]:
         """
         Query all configured ports concurrently and return their individual responses.
         """
-        async with httpx.AsyncClient(
-            timeout=self._timeout, follow_redirects=True
-        ) as client:
-            tasks = (
-                self._fetch_ashdod(client, container_id),
-                self._fetch_haifa(client, container_id),
-                self._fetch_hadarom(client, container_id),
-                self._fetch_bayport(client, container_id),
+        client = self._client
+        tasks = (
+            self._fetch_ashdod(client, container_id),
+            self._fetch_haifa(client, container_id),
+            self._fetch_hadarom(client, container_id),
+            self._fetch_bayport(client, container_id),
+        )
+        # Ashdod's budget covers its whole fallback chain; each attempt inside
+        # it is still held to the per-request deadline.
+        budgets = (self._ashdod_timeout, self._port_timeout, self._port_timeout, self._port_timeout)
+        responses = await asyncio.gather(
+            *(asyncio.wait_for(task, budget) for task, budget in zip(tasks, budgets, strict=True)),
+            return_exceptions=True,
+        )
+
+        return [
+            response
+            if isinstance(response, PortStatusResult)
+            else self._failed_port_result(port_name, port_url, response, budget)
+            for (port_name, port_url), response, budget in zip(
+                self._PORTS, responses, budgets, strict=True
             )
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
+        ]
 
-        port_names = ("נמל אשדוד", "נמל חיפה", "נמל הדרום", "נמל המפרץ")
-        results: list[PortStatusResult] = []
-        for port_name, response in zip(port_names, responses, strict=False):
-            if isinstance(response, PortStatusResult):
-                results.append(response)
-            else:
-                self._logger.error(
-                    "Container status lookup failed for %s: %s", port_name, response
+    def _failed_port_result(
+        self, port_name: str, port_url: str, exc: BaseException, budget: float
+    ) -> PortStatusResult:
+        if isinstance(exc, asyncio.TimeoutError):
+            self._logger.warning(
+                "Container status lookup for %s timed out after %.1fs",
+                port_name,
+                budget,
+            )
+            return PortStatusResult(port_name, port_url, False, _TIMEOUT_SUMMARY, error="timeout")
+        self._logger.error("Container status lookup failed for %s: %s", port_name, exc)
+        return PortStatusResult(port_name, "", False, _INTERNAL_ERROR_SUMMARY, error=str(exc))
+
+    @staticmethod
+    def _is_upstream_failure(result: PortStatusResult) -> bool:
+        # "missing-data" is a real answer (the port does not know the container).
+        return not result.success and result.error != "missing-data"
+
+    def _merge_stale(
+        self,
+        container_id: str,
+        results: list[PortStatusResult],
+        stale: list[PortStatusResult],
+    ) -> list[PortStatusResult]:
+        merged: list[PortStatusResult] = []
+        for fresh, old in zip(results, stale, strict=False):
+            if self._is_upstream_failure(fresh) and old.success:
+                self._logger.info(
+                    "Serving stale container status for %s from %s", container_id, fresh.port_name
                 )
-                results.append(
-                    PortStatusResult(
-                        port_name=port_name,
-                        url="",
-                        success=False,
-                        summary="שגיאה פנימית בזמן בדיקת הסטטוס.",
-                        error=str(response),
-                    )
+                if not old.summary.endswith(STALE_SUMMARY_NOTE):
+                    old.summary += STALE_SUMMARY_NOTE
+                merged.append(old)
+            else:
+                merged.append(fresh)
+        return merged
+
+    async def _cache_get(self, key: str) -> list[PortStatusResult] | None:
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(key)
+            except Exception as e:
+                self._logger.warning("Container status cache read failed, skipping cache: %s", e)
+                return None
+        else:
+            entry = self._local_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at < time.monotonic():
+                del self._local_cache[key]
+                return None
+            self._local_cache.move_to_end(key)
+        if raw is None:
+            return None
+        results: list[PortStatusResult] = []
+        for item in orjson.loads(raw):
+            # JSON turns the (label, value) tuples into lists
+            details = item.pop("details")
+            results.append(
+                PortStatusResult(
+                    **item,
+                    details=[tuple(pair) for pair in details] if details else None,
                 )
+            )
         return results
 
+    async def _cache_set(
+        self, key: str, results: list[PortStatusResult], ttl_seconds: int | None
+    ) -> None:
+        raw = orjson.dumps([asdict(result) for result in results])
+        if self._redis is not None:
+            try:
+                if ttl_seconds is None:
+                    await self._redis.set(key, raw)
+                else:
+                    await self._redis.setex(key, ttl_seconds, raw)
+            except Exception as e:
+                self._logger.warning("Container status cache write failed: %s", e)
+            return
+
+        expires_at = float("inf") if ttl_seconds is None else time.monotonic() + ttl_seconds
+        self._local_cache[key] = (expires_at, raw)
+        self._local_cache.move_to_end(key)
+        while len(self._local_cache) > MAX_LOCAL_CACHE_ENTRIES:
+            self._local_cache.popitem(last=False)
+
     async def _fetch_ashdod(
         self, client: httpx.AsyncClient, container_id: str
     ) -> PortStatusResult:
         try:
-            html = await self._get_ashdod_html(client, container_id)
-        except httpx.HTTPStatusError as exc:
-            if exc.response.status_code in {403, 429, 503}:
+            if time.monotonic() < self._ashdod_async_blocked_until:
+                html = await self._get_ashdod_html_fallback(container_id)
+            else:
                 try:
-                    # Try with sync client first
-                    html = await asyncio.to_thread(
-                        self._get_ashdod_html_sync, container_id
+                    html = await asyncio.wait_for(
+                        self._get_ashdod_html(client, container_id), self._port_timeout
                     )
-                except Exception:
-                    # If sync also fails, try with session (visit homepage first to get cookies)
-                    try:
-                        html = await asyncio.to_thread(
-                            self._get_ashdod_html_with_session, container_id
-                        )
-                    except Exception as fallback_exc:  # pragma: no cover - best effort
-                        return self._build_error_result(
-                            "נמל אשדוד",
-                            self.ASHDOD_URL,
-                            fallback_exc,
-                        )
-            else:
-                return self._build_error_result("נמל אשדוד", self.ASHDOD_URL, exc)
+                except httpx.HTTPStatusError as exc:
+                    if exc.response.status_code not in _ASHDOD_RETRY_STATUSES:
+                        raise
+                    self._record_ashdod_async_block(exc.response.status_code)
+                    html = await self._get_ashdod_html_fallback(container_id)
+                except asyncio.TimeoutError:
+                    html = await self._get_ashdod_html_fallback(container_id)
+                else:
+                    self._ashdod_async_failures = 0
         except Exception as exc:
             return self._build_error_result("נמל אשדוד", self.ASHDOD_URL, exc)
 
@@ -171,30 +444,48 @@ class ContainerStatusService:
             error=None if success else "missing-data",
         )
 
+    def _record_ashdod_async_block(self, status_code: int) -> None:
+        # The count is only reset by a successful async fetch, so once the breaker
+        # has opened, a single failed retry after the window opens it again.
+        self._ashdod_async_failures += 1
+        if self._ashdod_async_failures >= ASHDOD_BREAKER_THRESHOLD:
+            self._ashdod_async_blocked_until = time.monotonic() + ASHDOD_BREAKER_SECONDS
+            self._logger.warning(
+                "Ashdod rejected the async client %d times in a row (last status %s); "
+                "using the sync fallbacks for %.0fs",
+                self._ashdod_async_failures,
+                status_code,
+                ASHDOD_BREAKER_SECONDS,
+            )
+
+    async def _get_ashdod_html_fallback(self, container_id: str) -> str:
+        try:
+            return await asyncio.wait_for(
+                self._run_sync(self._get_ashdod_html_sync, container_id), self._port_timeout
+            )
+        except Exception:
+            # If sync also fails, try with session (visit homepage first to get cookies)
+            return await asyncio.wait_for(
+                self._run_sync(self._get_ashdod_html_with_session, container_id),
+                self._port_timeout,
+            )
+
     async def _get_ashdod_html(
         self, client: httpx.AsyncClient, container_id: str
     ) -> str:
         resp = await client.get(
-            self.ASHDOD_URL,
-            params={"MISMHOLA": container_id},
-            headers=self.ASHDOD_HEADERS,
+            self._ASHDOD_STATUS_URL.format(quote(container_id, safe="")),
+            headers=self.ASHDOD_REQUEST_HEADERS,
         )
         resp.raise_for_status()
         return resp.text
 
     def _get_ashdod_html_sync(self, container_id: str) -> str:
-        with httpx.Client(
-            headers=self.ASHDOD_HEADERS,
-            timeout=self._timeout,
-            follow_redirects=True,
-            http2=True,
-        ) as sync_client:
-            resp = sync_client.get(
-                self.ASHDOD_URL,
-                params={"MISMHOLA": container_id},
-            )
-            resp.raise_for_status()
-            return resp.text
+        resp = self._get_ashdod_sync_client().get(
+            self._ASHDOD_STATUS_URL.format(quote(container_id, safe="")),
+        )
+        resp.raise_for_status()
+        return resp.text
 
     def _get_ashdod_html_with_session(self, container_id: str) -> str:
         """
@@ -206,7 +497,7 @@ class ContainerStatusService:
         
         with httpx.Client(
             headers=self.ASHDOD_HEADERS,
-            timeout=self._timeout,
+            timeout=self._port_timeout,
             follow_redirects=True,
             http2=True,
             cookies={},  # Explicitly manage cookies
@@ -233,8 +524,7 @@ class ContainerStatusService:
                 "Referer": "https://www.ashdodport.co.il/",
             }
             resp = sync_client.get(
-                self.ASHDOD_URL,
-                params={"MISMHOLA": container_id},
+                self._ASHDOD_STATUS_URL.format(quote(container_id, safe="")),
                 headers=status_headers,
             )
             resp.raise_for_status()
@@ -249,18 +539,15 @@ class ContainerStatusService:
         """
 
         def _call_sync() -> tuple[dict[str, Any], str]:
-            with httpx.Client(
-                timeout=self._timeout, follow_redirects=True, headers=self.HAIFA_HEADERS
-            ) as sync_client:
-                resp = sync_client.post(
-                    self.HAIFA_AJAX_URL,
-                    data={"action": "requestHandle", "path": f"containers/{container_id}"},
-                )
-                resp.raise_for_status()
-                return resp.json(), str(resp.request.url)
+            resp = self._get_haifa_sync_client().post(
+                self.HAIFA_AJAX_URL,
+                data={"action": "requestHandle", "path": f"containers/{container_id}"},
+            )
+            resp.raise_for_status()
+            return orjson.loads(resp.content), str(resp.request.url)
 
         try:
-            payload, url = await asyncio.to_thread(_call_sync)
+            payload, url = await self._run_sync(_call_sync)
             if "error" in payload:
                 return PortStatusResult(
                     port_name="נמל חיפה",
@@ -285,12 +572,11 @@ class ContainerStatusService:
     ) -> PortStatusResult:
         try:
             resp = await client.get(
-                self.HADEROM_API,
-                params={"action": "search", "type": "container", "id": container_id},
+                self._HADEROM_SEARCH_URL.format(quote(container_id, safe="")),
                 headers=self.HADEROM_HEADERS,
             )
             resp.raise_for_status()
-            payload = resp.json()
+            payload = orjson.loads(resp.content)
             summary, details = self._summarize_hadarom(payload)
             success = payload.get("result") == 1
             if not success and not summary:
@@ -321,7 +607,7 @@ class ContainerStatusService:
                 },
             )
             resp.raise_for_status()
-            payload = resp.json()
+            payload = orjson.loads(resp.content)
             summary, details, has_entries = self._summarize_bayport(payload)
             return PortStatusResult(
                 port_name="נמל המפרץ",
@@ -335,50 +621,72 @@ class ContainerStatusService:
             return self._build_error_result("נמל המפרץ", self.BAYPORT_API, exc)
 
     def _parse_ashdod_html(self, html: str) -> dict[str, Any]:
-        soup = BeautifulSoup(html, "html.parser")
-        table = soup.find("table")
-        if not table:
-            return {"events": []}
+        # Pull-parse the page in chunks and stop once the first table ends or
+        # enough rows are collected, so the rest of the (large WebForms) page is
+        # never parsed. The first row of the table is its header.
+        parser = self._ashdod_pull_parser()
+        try:
+            return {"events": self._collect_ashdod_events(parser, html)}
+        finally:
+            # Resets the parser for the next page; the rest of the page is
+            # discarded along with any "Document is empty" error.
+            try:
+                parser.close()
+            except lxml.etree.LxmlError:
+                pass
+            for _ in parser.read_events():
+                pass
 
-        rows = table.find_all("tr")
-        if len(rows) <= 1:
-            return ""
+    @staticmethod
+    def _ashdod_pull_parser() -> lxml.etree.HTMLPullParser:
+        parser = getattr(_ASHDOD_PARSERS, "parser", None)
+        if parser is None:
+            parser = _ASHDOD_PARSERS.parser = lxml.etree.HTMLPullParser(
+                events=("start", "end"),
+                tag=("table", "tr"),
+                remove_blank_text=True,
+                remove_comments=True,
+                remove_pis=True,
+            )
+        return parser
 
+    @staticmethod
+    def _collect_ashdod_events(parser: lxml.etree.HTMLPullParser, html: str) -> list[str]:
+        table = None
+        header_seen = False
         summaries: list[str] = []
-        for row in rows[1:]:
-            cells = [cell.get_text(strip=True) for cell in row.find_all("td")]
-            if len(cells) < 4:
-                continue
-            date, short_desc, long_desc = cells[1], cells[2], cells[3]
-            movement = cells[4] if len(cells) > 4 else ""
-            summaries.append(f"{date} | {short_desc} – {long_desc} ({movement})")
-        return {"events": summaries[:5]}
+        for offset in range(0, len(html), ASHDOD_PARSE_CHUNK_CHARS):
+            parser.feed(html[offset : offset + ASHDOD_PARSE_CHUNK_CHARS])
+            for event, elem in parser.read_events():
+                if table is None:
+                    if event == "start" and elem.tag == "table":
+                        table = elem
+                    continue
+                if event == "end" and elem is table:
+                    return summaries
+                if event != "end" or elem.tag != "tr":
+                    continue
+                if not header_seen:
+                    header_seen = True
+                    elem.clear()
+                    continue
+                cells = ["".join(cell.itertext()).strip() for cell in elem.iter("td")]
+                elem.clear()
+                if len(cells) < 4:
+                    continue
+                movement = cells[4] if len(cells) > 4 else ""
+                summaries.append(f"{cells[1]} | {cells[2]} – {cells[3]} ({movement})")
+                if len(summaries) == ASHDOD_MAX_EVENTS:
+                    return summaries
+        return summaries
 
     @staticmethod
     def _summarize_haifa(payload: dict[str, Any]) -> tuple[str, list[tuple[str, str]]]:
         current = payload.get("current") or {}
         if not current:
             return "לא נמצאו נתונים עבור המכולה.", []
-        label_map = {
-            "ContainerId": "מספר מכולה",
-            "Category": "סיווג",
-            "FreightKind": "סוג טעינה",
-            "ContainerType": "סוג מכולה",
-            "GrossWeight": "משקל ברוטו",
-            "TimeFacilityIn": "תאריך כניסה",
-            "TimeFacilityOut": "תאריך יציאה",
-            "StorageCode": "קוד אחסנה",
-            "LineOperator": "חברת קו",
-            "ShippingAgentName": "סוכן אוניה",
-            "CustomsAgentName": "סוכן מכס",
-            "InboundMode": "מצב כניסה",
-            "OutboundMode": "מצב יציאה",
-            "InboundVesselName": "שם אוניה נכנסת",
-            "OutboundVesselName": "שם אוניה יוצאת",
-            "AppointmentTruckingCompanyName": "חברת הובלה",
-        }
         details: list[tuple[str, str]] = []
-        for key, label in label_map.items():
+        for key, label in _HAIFA_LABEL_MAP.items():
             value = current.get(key)
             if value not in (None, "", []):
                 details.append((label, str(value)))
@@ -433,8 +741,8 @@ class ContainerStatusService:
         inner = data_block.get("data")
         if isinstance(inner, str):
             try:
-                inner = json.loads(inner)
-            except json.JSONDecodeError:
+                inner = orjson.loads(inner)
+            except orjson.JSONDecodeError:
                 inner = {}
         if not isinstance(inner, dict):
             return "לא נמצאו נתונים עבור המכולה.", [], False
@@ -7,11 +7,106 @@ rank them, and synthesize a final answer.
 from __future__ import annotations
 
 import asyncio
-import json
+import hashlib
+import logging
 import os
+import random
+from collections import OrderedDict
 from typing import Any, Mapping, Sequence
 
 import httpx
+import orjson
+
+from app.services.prompt_context import PromptContext, build_answer_instructions
+
+logger = logging.getLogger(__name__)
+
+# Shared cap on in-flight OpenRouter requests per service, so bursts of council
+# fan-outs queue here instead of tripping the per-key rate limit.
+MAX_CONCURRENT_REQUESTS = 8
+MAX_RETRIES = 3
+MAX_RETRY_DELAY_SECONDS = 30.0
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+MAX_CACHED_RESPONSES = 1024
+# Stage 1 stops waiting once this many models have answered, or this long after
+# the first answer, so one slow model does not hold up the whole council.
+MIN_STAGE1_ANSWERS = 2
+STAGE1_GRACE_SECONDS = 8.0
+
+# Static prompt text, built once at import; requests only add their dynamic parts.
+_STAGE1_RESPONSE_FORMAT = (
+    "Respond with a single JSON object and nothing else, in this shape:\n"
+    '{"answer": "<your full answer, in Hebrew>", '
+    '"self_confidence": <number from 0 to 1>, '
+    '"key_claims": ["<short factual claim your answer relies on>", ...]}'
+)
+
+_DEFAULT_SYSTEM_INSTRUCTION = (
+    "You are a data analyst and operations expert for a port operations team. "
+    "Answer in Hebrew, using the data provided in the JSON context and any knowledge base excerpts. "
+    "\n\n"
+    "WRITING STYLE GUIDELINES:\n"
+    "- Keep answers concise and focused - maximum 3-4 short paragraphs\n"
+    "- Use bullet points (•) sparingly, only for key information\n"
+    "- Start with a direct answer to the question\n"
+    "- Use clear, simple language - avoid unnecessary technical jargon\n"
+    "- For regulatory/operational questions: summarize main points, don't list every detail\n"
+    "- Highlight the most important information first\n"
+    "- Use bold (**text**) only for critical information\n"
+    "\n"
+    "IMPORTANT: If the question asks about dates, months, or time periods, "
+    "you MUST interpret and extract them from the question text, even if they "
+    "are written in Hebrew or with typos. For example:\n"
+    "- 'כמה מכולות נפרקו בפברואר 25' means 'how many containers were unloaded in February 2025'\n"
+    "- 'כמה מכולות בפבאור 25' means February 2025 (פבאור is a typo for פברואר)\n"
+    "- Hebrew month names: ינואר=January, פברואר=February, מרץ=March, אפריל=April, "
+    "מאי=May, יוני=June, יולי=July, אוגוסט=August, ספטמבר=September, "
+    "אוקטובר=October, נובמבר=November, דצמבר=December\n"
+    "- Years: '25' means 2025, '24' means 2024, etc.\n"
+    "\n"
+    "When answering questions about containers or vehicles:\n"
+    "- Look for date ranges in the 'period' field of the metrics\n"
+    "- Count containers from 'containers.daily_counts' or calculate from 'containers.total_records'\n"
+    "- For monthly queries, sum all containers in that month from 'containers.daily_counts'\n"
+    "- Always provide specific numbers when available\n"
+    "\n"
+    "For operational questions (e.g., procedures, regulations, port operations, job requirements):\n"
+    "- Use information from knowledge base excerpts if provided\n"
+    "- If no relevant excerpts are provided, you MUST use your general knowledge about:\n"
+    "  * Port operations and maritime industry standards\n"
+    "  * Israeli port regulations and procedures\n"
+    "  * Common operational requirements and best practices\n"
+    "- Be specific and practical in your answers\n"
+    "- DO NOT say 'no information available' - instead provide an answer based on general knowledge\n"
+    "- You can mention that the answer is based on general knowledge, but still provide the information\n"
+    "\n"
+    "If the context lacks information required to answer accurately, "
+    "state clearly what is missing instead of guessing."
+)
+
+_ANSWER_INSTRUCTIONS = build_answer_instructions(
+    (
+        "To find February 2025, look for keys starting with '202502' (2025-02-XX)",
+        "To find January 2024, look for keys starting with '202401' (2024-01-XX)",
+    )
+)
+
+_CHAIRMAN_PREAMBLE = (
+    "You are the Chairman of an LLM Council. Multiple AI models have answered a user's "
+    "question independently; each reported its own confidence and the key claims it relies on."
+)
+
+_CHAIRMAN_TASK = "\n".join(
+    (
+        "Your task as Chairman:",
+        "1. Privately evaluate and rank the answers: check their key claims against the context, "
+        "prefer claims several answers agree on, and treat self-reported confidence only as a weak signal.",
+        "2. Synthesize a single, comprehensive, accurate answer to the user's original question "
+        "from the best-supported content.",
+        "",
+        "Reply with the final answer only, in Hebrew - do not include your evaluation or ranking:",
+    )
+)
 
 
 class CouncilService:
@@ -24,11 +119,16 @@ class CouncilService:
         api_key: str,
         council_models: list[str] | None = None,
         chairman_model: str | None = None,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
     ) -> None:
         if not api_key:
             raise ValueError("OpenRouter API key is required")
         self._api_key = api_key
         self._api_url = "https://openrouter.ai/api/v1/chat/completions"
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
         
         # Default models if not provided
         self._council_models = council_models or [
@@ -37,6 +137,26 @@ class CouncilService:
             "anthropic/claude-3.5-sonnet",
         ]
         self._chairman_model = chairman_model or "google/gemini-2.0-flash-exp"
+        # One pooled client for the process lifetime; every question makes N+1
+        # calls to the same host, so reused (HTTP/2) connections skip the handshakes.
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Replies by (model, request) so repeated identical prompts skip the round-trip
+        self._response_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        # Requests on the wire by the same key, and how many callers await each,
+        # so concurrent users asking the same thing share one OpenRouter call
+        self._inflight: dict[str, asyncio.Task[dict[str, Any] | None]] = {}
+        self._inflight_waiters: dict[str, int] = {}
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self._client.aclose()
 
     async def answer_question(
         self,
@@ -53,10 +173,12 @@ class CouncilService:
         """
         # Build the prompt with context
         prompt = self._build_prompt(
-            question=question,
-            metrics=metrics,
-            knowledge_sections=knowledge_sections,
-            conversation_history=conversation_history,
+            PromptContext(
+                question=question,
+                metrics=metrics,
+                knowledge_sections=knowledge_sections,
+                conversation_history=conversation_history,
+            )
         )
 
         # Build system instruction
@@ -69,177 +191,115 @@ class CouncilService:
 
         if not stage1_results:
             return "מצטער, לא הצלחתי לקבל תשובות מהמודלים. אנא נסה שוב."
+        if len(stage1_results) == 1:
+            # Nothing to rank or merge; a chairman round-trip would only restate it
+            return stage1_results[0]["response"]
 
-        # Stage 2: Get rankings from all models
-        stage2_results, label_to_model = await self._stage2_collect_rankings(
+        # Stage 3: The chairman ranks the answers and synthesizes the final one in a
+        # single call; there is no separate peer-ranking round (N more round-trips).
+        final_answer = await self._stage3_synthesize_final(
             question, prompt, stage1_results, system_instruction_text
         )
-
-        # Stage 3: Synthesize final answer
-        final_response = await self._stage3_synthesize_final(
-            question, prompt, stage1_results, stage2_results, system_instruction_text
-        )
-
-        return final_response
+        return final_answer.strip()
 
     async def _stage1_collect_responses(
         self, prompt: str, system_instruction: str
     ) -> list[dict[str, Any]]:
-        """Stage 1: Collect individual responses from all council models."""
+        """Stage 1: Collect structured responses from all council models."""
         messages = [
             {"role": "system", "content": system_instruction},
-            {"role": "user", "content": prompt},
+            {"role": "user", "content": f"{prompt}\n\n{_STAGE1_RESPONSE_FORMAT}"},
         ]
 
         # Query all models in parallel
-        tasks = [
-            self._query_model(model, messages) for model in self._council_models
-        ]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Format results
-        stage1_results = []
-        for model, response in zip(self._council_models, responses):
-            if isinstance(response, Exception):
-                continue
-            if response and response.get("content"):
-                stage1_results.append(
-                    {"model": model, "response": response.get("content", "")}
-                )
-
-        return stage1_results
-
-    async def _stage2_collect_rankings(
-        self,
-        question: str,
-        original_prompt: str,
-        stage1_results: list[dict[str, Any]],
-        system_instruction: str,
-    ) -> tuple[list[dict[str, Any]], dict[str, str]]:
-        """Stage 2: Each model ranks the anonymized responses."""
-        # Create anonymized labels
-        labels = [chr(65 + i) for i in range(len(stage1_results))]  # A, B, C, ...
-
-        # Create mapping from label to model name
-        label_to_model = {
-            f"Response {label}": result["model"]
-            for label, result in zip(labels, stage1_results)
+        tasks = {
+            asyncio.create_task(
+                self._query_model(model, messages, response_format={"type": "json_object"})
+            ): index
+            for index, model in enumerate(self._council_models)
         }
-
-        # Build the ranking prompt
-        responses_text = "\n\n".join(
-            [
-                f"Response {label}:\n{result['response']}"
-                for label, result in zip(labels, stage1_results)
-            ]
-        )
-
-        ranking_prompt = f"""You are evaluating different responses to the following question:
-
-Question: {question}
-
-Original Context:
-{original_prompt}
-
-Here are the responses from different models (anonymized):
-
-{responses_text}
-
-Your task:
-1. First, evaluate each response individually. For each response, explain what it does well and what it does poorly.
-2. Then, at the very end of your response, provide a final ranking.
-
-IMPORTANT: Your final ranking MUST be formatted EXACTLY as follows:
-- Start with the line "FINAL RANKING:" (all caps, with colon)
-- Then list the responses from best to worst as a numbered list
-- Each line should be: number, period, space, then ONLY the response label (e.g., "1. Response A")
-- Do not add any other text or explanations in the ranking section
-
-Example of the correct format for your ENTIRE response:
-
-Response A provides good detail on X but misses Y...
-Response B is accurate but lacks depth on Z...
-Response C offers the most comprehensive answer...
-
-FINAL RANKING:
-1. Response C
-2. Response A
-3. Response B
-
-Now provide your evaluation and ranking:"""
-
-        messages = [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": ranking_prompt},
+        answers: dict[int, dict[str, Any]] = {}
+        pending = set(tasks)
+        loop = asyncio.get_running_loop()
+        deadline: float | None = None
+        try:
+            while pending and len(answers) < MIN_STAGE1_ANSWERS:
+                timeout = None if deadline is None else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    response = task.result()
+                    if response and response.get("content"):
+                        answers[tasks[task]] = self._parse_structured_answer(response["content"])
+                if answers and deadline is None:
+                    deadline = loop.time() + STAGE1_GRACE_SECONDS
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if pending:
+            logger.info(
+                "Stage 1 went ahead with %d answers; cancelled %d slower models",
+                len(answers),
+                len(pending),
+            )
+
+        # Keep council order so labels do not depend on which model was fastest
+        return [
+            {"model": self._council_models[index], **answers[index]}
+            for index in sorted(answers)
         ]
 
-        # Get rankings from all council models in parallel
-        tasks = [
-            self._query_model(model, messages) for model in self._council_models
-        ]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Format results
-        stage2_results = []
-        for model, response in zip(self._council_models, responses):
-            if isinstance(response, Exception):
-                continue
-            if response and response.get("content"):
-                full_text = response.get("content", "")
-                parsed = self._parse_ranking_from_text(full_text)
-                stage2_results.append(
-                    {
-                        "model": model,
-                        "ranking": full_text,
-                        "parsed_ranking": parsed,
-                    }
-                )
+    @staticmethod
+    def _parse_structured_answer(content: str) -> dict[str, Any]:
+        """Read a stage 1 JSON answer; models that ignore the format count as plain text."""
+        try:
+            data = orjson.loads(content)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not data.get("answer"):
+            return {"response": content.strip(), "self_confidence": None, "key_claims": []}
 
-        return stage2_results, label_to_model
+        try:
+            confidence = min(max(float(data.get("self_confidence")), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = None
+        key_claims = data.get("key_claims")
+        return {
+            "response": str(data["answer"]).strip(),
+            "self_confidence": confidence,
+            "key_claims": [str(claim) for claim in key_claims]
+            if isinstance(key_claims, list)
+            else [],
+        }
 
     async def _stage3_synthesize_final(
         self,
         question: str,
         original_prompt: str,
         stage1_results: list[dict[str, Any]],
-        stage2_results: list[dict[str, Any]],
         system_instruction: str,
     ) -> str:
-        """Stage 3: Chairman synthesizes final response."""
-        # Build comprehensive context for chairman
-        stage1_text = "\n\n".join(
-            [
-                f"Model: {result['model']}\nResponse: {result['response']}"
-                for result in stage1_results
-            ]
-        )
-
-        stage2_text = "\n\n".join(
-            [
-                f"Model: {result['model']}\nRanking: {result['ranking']}"
-                for result in stage2_results
-            ]
+        """Stage 3: Chairman ranks the council's answers and synthesizes the final response."""
+        # Anonymized so the chairman judges the answers, not the model names;
+        # the prompt is collected as parts and joined once.
+        parts = [
+            _CHAIRMAN_PREAMBLE,
+            f"Original Question: {question}",
+            f"Original Context:\n{original_prompt}",
+            "Council answers (anonymized):",
+        ]
+        parts.extend(
+            self._format_council_answer(chr(65 + index), result)
+            for index, result in enumerate(stage1_results)
         )
-
-        chairman_prompt = f"""You are the Chairman of an LLM Council. Multiple AI models have provided responses to a user's question, and then ranked each other's responses.
-
-Original Question: {question}
-
-Original Context:
-{original_prompt}
-
-STAGE 1 - Individual Responses:
-{stage1_text}
-
-STAGE 2 - Peer Rankings:
-{stage2_text}
-
-Your task as Chairman is to synthesize all of this information into a single, comprehensive, accurate answer to the user's original question. Consider:
-- The individual responses and their insights
-- The peer rankings and what they reveal about response quality
-- Any patterns of agreement or disagreement
-
-Provide a clear, well-reasoned final answer in Hebrew that represents the council's collective wisdom:"""
+        parts.append(_CHAIRMAN_TASK)
+        chairman_prompt = "\n\n".join(parts)
 
         messages = [
             {"role": "system", "content": system_instruction},
@@ -248,232 +308,135 @@ Provide a clear, well-reasoned final answer in Hebrew that represents the counci
 
         # Query the chairman model
         response = await self._query_model(self._chairman_model, messages)
+        if response and response.get("content"):
+            return response["content"]
 
-        if not response or not response.get("content"):
-            # Fallback to best ranked response from stage 1
-            if stage1_results:
-                return stage1_results[0]["response"]
-            return "מצטער, לא הצלחתי ליצור תשובה סופית."
+        # Fallback to the most confident stage 1 answer
+        if stage1_results:
+            best = max(stage1_results, key=lambda result: result["self_confidence"] or 0.0)
+            return best["response"]
+        return "מצטער, לא הצלחתי ליצור תשובה סופית."
 
-        return response.get("content", "").strip()
+    @staticmethod
+    def _format_council_answer(label: str, result: Mapping[str, Any]) -> str:
+        confidence = result["self_confidence"]
+        lines = [
+            f"Response {label}:",
+            result["response"],
+            f"Self-reported confidence: {confidence:.2f}"
+            if confidence is not None
+            else "Self-reported confidence: not given",
+        ]
+        if result["key_claims"]:
+            lines.append("Key claims:")
+            lines.extend(f"- {claim}" for claim in result["key_claims"])
+        return "\n".join(lines)
 
     async def _query_model(
-        self, model: str, messages: list[dict[str, str]], timeout: float = 120.0
+        self,
+        model: str,
+        messages: list[dict[str, str]],
+        timeout: float = 120.0,
+        response_format: Mapping[str, Any] | None = None,
     ) -> dict[str, Any] | None:
         """Query a single model via OpenRouter API."""
-        headers = {
-            "Authorization": f"Bearer {self._api_key}",
-            "Content-Type": "application/json",
-        }
-
-        payload = {
+        payload: dict[str, Any] = {
             "model": model,
             "messages": messages,
+            # Reasoning models still think, but the trace is not sent back to us
+            "reasoning": {"exclude": True},
         }
-
+        if response_format is not None:
+            payload["response_format"] = response_format
+
+        body = orjson.dumps(payload)
+        cache_key = hashlib.sha256(body).hexdigest()
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            return cached
+
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._post_model(model, body, cache_key, timeout))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(cache_key, done))
+        self._inflight_waiters[cache_key] = self._inflight_waiters.get(cache_key, 0) + 1
         try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.post(
-                    self._api_url, headers=headers, json=payload
-                )
-                response.raise_for_status()
-
-                data = response.json()
-                message = data["choices"][0]["message"]
-
-                return {
-                    "content": message.get("content"),
-                    "reasoning_details": message.get("reasoning_details"),
-                }
+            # Shielded so one caller giving up does not cancel the others' request
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight_waiters[cache_key] == 1 and not task.done():
+                # Last one waiting (e.g. a stage 1 laggard); stop the request itself
+                self._forget_inflight(cache_key, task)
+                task.cancel()
+            raise
+        finally:
+            remaining = self._inflight_waiters.pop(cache_key, 1) - 1
+            if remaining:
+                self._inflight_waiters[cache_key] = remaining
+
+    def _forget_inflight(self, cache_key: str, task: asyncio.Task[Any]) -> None:
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+
+    async def _post_model(
+        self, model: str, body: bytes, cache_key: str, timeout: float
+    ) -> dict[str, Any] | None:
+        """Send one chat completion request, retrying rate limits, and cache the reply."""
+        try:
+            async with self._semaphore:
+                for attempt in range(MAX_RETRIES + 1):
+                    response = await self._client.post(
+                        self._api_url,
+                        headers=self._headers,
+                        content=body,
+                        timeout=httpx.Timeout(timeout, connect=10.0),
+                    )
+                    if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                        break
+                    await self._wait_before_retry(model, response, attempt)
+            response.raise_for_status()
+
+            data = orjson.loads(response.content)
+            message = data["choices"][0]["message"]
+
+            result = {"content": message.get("content")}
+            if result["content"]:
+                self._response_cache[cache_key] = result
+                while len(self._response_cache) > MAX_CACHED_RESPONSES:
+                    self._response_cache.popitem(last=False)
+            return result
         except Exception as e:
             # Log error but don't crash
-            import logging
-
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error querying model {model}: {e}")
+            logger.error("Error querying model %s: %s", model, e)
             return None
 
     @staticmethod
-    def _parse_ranking_from_text(ranking_text: str) -> list[str]:
-        """Parse the FINAL RANKING section from the model's response."""
-        import re
-
-        # Look for "FINAL RANKING:" section
-        if "FINAL RANKING:" in ranking_text:
-            # Extract everything after "FINAL RANKING:"
-            parts = ranking_text.split("FINAL RANKING:")
-            if len(parts) >= 2:
-                ranking_section = parts[1]
-                # Try to extract numbered list format (e.g., "1. Response A")
-                numbered_matches = re.findall(
-                    r"\d+\.\s*Response [A-Z]", ranking_section
-                )
-                if numbered_matches:
-                    # Extract just the "Response X" part
-                    return [
-                        re.search(r"Response [A-Z]", m).group() for m in numbered_matches
-                    ]
-
-                # Fallback: Extract all "Response X" patterns in order
-                matches = re.findall(r"Response [A-Z]", ranking_section)
-                return matches
-
-        # Fallback: try to find any "Response X" patterns in order
-        matches = re.findall(r"Response [A-Z]", ranking_text)
-        return matches
+    async def _wait_before_retry(model: str, response: httpx.Response, attempt: int) -> None:
+        """Back off exponentially (with jitter), honouring a numeric Retry-After header."""
+        try:
+            delay = float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = 2**attempt + random.random()
+        delay = min(delay, MAX_RETRY_DELAY_SECONDS)
+        logger.warning(
+            "OpenRouter returned %d for %s; retrying in %.1fs (attempt %d/%d)",
+            response.status_code,
+            model,
+            delay,
+            attempt + 1,
+            MAX_RETRIES,
+        )
+        await asyncio.sleep(delay)
 
     @staticmethod
-    def _build_prompt(
-        *,
-        question: str,
-        metrics: Mapping[str, Any],
-        knowledge_sections: Sequence[Mapping[str, str]] | None = None,
-        conversation_history: Sequence[Mapping[str, Any]] | None = None,
-    ) -> str:
-        """Build the prompt with context and metrics."""
-        context = json.dumps(metrics, ensure_ascii=False, indent=2)
-        parts = [
-            "Contextual data (JSON):",
-            context,
-        ]
-        
-        # Add conversation history if available
-        if conversation_history:
-            parts.append("\nPrevious conversation context:")
-            for idx, hist_item in enumerate(conversation_history, start=1):
-                user_q = hist_item.get("user_text", "")
-                bot_a = hist_item.get("response_text", "")
-                if user_q or bot_a:
-                    parts.append(f"\n[Previous exchange {idx}]:")
-                    if user_q:
-                        parts.append(f"User: {user_q}")
-                    if bot_a:
-                        # Truncate long responses to avoid token limits
-                        truncated = bot_a[:200] + "..." if len(bot_a) > 200 else bot_a
-                        parts.append(f"Bot: {truncated}")
-            parts.append("\n---")
-        if knowledge_sections:
-            parts.append("Relevant knowledge base excerpts:")
-            for index, section in enumerate(knowledge_sections, start=1):
-                # Support both hazard documents (document_title/document_id) and topic knowledge (topic)
-                title = (
-                    section.get("document_title")
-                    or section.get("topic")
-                    or section.get("document_id")
-                    or f"Section {index}"
-                )
-                source = section.get("source_file", "document")
-                excerpt = section.get("excerpt", "").strip()
-                identifier = section.get("section_id", f"{index}")
-                if not excerpt:
-                    continue
-                parts.append(
-                    f"[{index}] {title} ({source}, id={identifier}):\n{excerpt}"
-                )
-        else:
-            parts.append("IMPORTANT: No specific knowledge base excerpts were found for this question.")
-            parts.append("This means either:")
-            parts.append("1. The relevant document is not in the knowledge base yet")
-            parts.append("2. The search did not find matching content")
-            parts.append("")
-            parts.append("Before answering with general knowledge, check if the question mentions specific documents, regulations, or procedures that might exist in the knowledge base.")
-            parts.append("If the question is about Israeli port operations, regulations, or procedures, there may be official documents that should be consulted.")
-            parts.append("")
-            parts.append("You should still provide an answer using your general knowledge, but mention that specific documents (like 'נוהל התור התפעולי' or 'רשות הספנות והנמלים') might contain more accurate information.")
-        
-        parts.append("Question:")
-        parts.append(question)
-        parts.append("\n")
-        parts.append("Instructions:")
-        parts.append("- Answer the question based on the context provided above (metrics data)")
-        parts.append("- If the question is about operational procedures, regulations, port operations, or job requirements:")
-        parts.append("  * FIRST: Check if knowledge base excerpts are available - if yes, use them as the primary source")
-        parts.append("  * If no excerpts are available, check if the question mentions specific documents (e.g., 'נוהל התור התפעולי', 'רשות הספנות והנמלים')")
-        parts.append("  * If specific documents are mentioned but not found in excerpts, mention that these documents should be added to the knowledge base for accurate answers")
-        parts.append("  * Then use your general knowledge about port operations, maritime industry, and Israeli port regulations")
-        parts.append("  * Provide a helpful, accurate answer based on standard industry practices")
-        parts.append("- For questions about data (containers, vehicles, dates): use only the metrics data provided")
-        parts.append("- Always provide a clear, helpful answer in Hebrew")
-        parts.append("- If you're using general knowledge (not from the provided data), mention it, but still provide the answer")
-        parts.append(
-            "\n"
-            "CRITICAL INSTRUCTIONS:\n"
-            "\n"
-            "WRITING STYLE - Keep your answer concise and clear:\n"
-            "- Maximum 3-4 short paragraphs\n"
-            "- Start with a direct, clear answer\n"
-            "- Use bullet points only for key information (max 3-4 bullets)\n"
-            "- Summarize main points, don't list every detail\n"
-            "- Use simple, professional language\n"
-            "\n"
-            "1. DATE INTERPRETATION:\n"
-            "   - Extract month names and years from the question, even with typos\n"
-            "   - Hebrew months: ינואר=01, פברואר=02, מרץ=03, אפריל=04, מאי=05, יוני=06, "
-            "יולי=07, אוגוסט=08, ספטמבר=09, אוקטובר=10, נובמבר=11, דצמבר=12\n"
-            "   - Common typos: 'פבאור' or 'פבואר' = פברואר (February)\n"
-            "   - Years: '25' = 2025, '24' = 2024, etc.\n"
-            "\n"
-            "2. DATA FORMAT:\n"
-            "   - Dates in 'containers.daily_counts' are in YYYYMMDD format (e.g., '20250215' = Feb 15, 2025)\n"
-            "   - To find February 2025, look for keys starting with '202502' (2025-02-XX)\n"
-            "   - To find January 2024, look for keys starting with '202401' (2024-01-XX)\n"
-            "\n"
-            "3. CALCULATION:\n"
-            "   - For monthly queries: Sum ALL values in 'containers.daily_counts' where the key starts with YYYYMM\n"
-            "   - Example: For February 2025, sum all values where key starts with '202502'\n"
-            "   - For date range queries: Sum values for all dates in that range\n"
-            "\n"
-            "4. RESPONSE FORMAT:\n"
-            "   - Always provide the exact number found\n"
-            "   - Answer in Hebrew\n"
-            "   - Format: 'בחודש [חודש] [שנה] נפרקו [מספר] מכולות'\n"
-            "   - If data not found, explain what you searched for (e.g., 'חיפשתי מכולות בפברואר 2025 אך לא מצאתי נתונים')"
-        )
-        return "\n\n".join(parts)
+    def _build_prompt(context: PromptContext) -> str:
+        """Build the prompt from the shared, lazily rendered question context."""
+        return context.render(_ANSWER_INSTRUCTIONS)
 
     @staticmethod
     def _get_default_system_instruction() -> str:
         """Get the default system instruction."""
-        return (
-            "You are a data analyst and operations expert for a port operations team. "
-            "Answer in Hebrew, using the data provided in the JSON context and any knowledge base excerpts. "
-            "\n\n"
-            "WRITING STYLE GUIDELINES:\n"
-            "- Keep answers concise and focused - maximum 3-4 short paragraphs\n"
-            "- Use bullet points (•) sparingly, only for key information\n"
-            "- Start with a direct answer to the question\n"
-            "- Use clear, simple language - avoid unnecessary technical jargon\n"
-            "- For regulatory/operational questions: summarize main points, don't list every detail\n"
-            "- Highlight the most important information first\n"
-            "- Use bold (**text**) only for critical information\n"
-            "\n"
-            "IMPORTANT: If the question asks about dates, months, or time periods, "
-            "you MUST interpret and extract them from the question text, even if they "
-            "are written in Hebrew or with typos. For example:\n"
-            "- 'כמה מכולות נפרקו בפברואר 25' means 'how many containers were unloaded in February 2025'\n"
-            "- 'כמה מכולות בפבאור 25' means February 2025 (פבאור is a typo for פברואר)\n"
-            "- Hebrew month names: ינואר=January, פברואר=February, מרץ=March, אפריל=April, "
-            "מאי=May, יוני=June, יולי=July, אוגוסט=August, ספטמבר=September, "
-            "אוקטובר=October, נובמבר=November, דצמבר=December\n"
-            "- Years: '25' means 2025, '24' means 2024, etc.\n"
-            "\n"
-            "When answering questions about containers or vehicles:\n"
-            "- Look for date ranges in the 'period' field of the metrics\n"
-            "- Count containers from 'containers.daily_counts' or calculate from 'containers.total_records'\n"
-            "- For monthly queries, sum all containers in that month from 'containers.daily_counts'\n"
-            "- Always provide specific numbers when available\n"
-            "\n"
-            "For operational questions (e.g., procedures, regulations, port operations, job requirements):\n"
-            "- Use information from knowledge base excerpts if provided\n"
-            "- If no relevant excerpts are provided, you MUST use your general knowledge about:\n"
-            "  * Port operations and maritime industry standards\n"
-            "  * Israeli port regulations and procedures\n"
-            "  * Common operational requirements and best practices\n"
-            "- Be specific and practical in your answers\n"
-            "- DO NOT say 'no information available' - instead provide an answer based on general knowledge\n"
-            "- You can mention that the answer is based on general knowledge, but still provide the information\n"
-            "\n"
-            "If the context lacks information required to answer accurately, "
-            "state clearly what is missing instead of guessing."
-        )
+        return _DEFAULT_SYSTEM_INSTRUCTION
 
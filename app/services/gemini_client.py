@@ -4,15 +4,24 @@ Gemini client wrapper for advanced analytical responses based on Supabase data.
 
 from __future__ import annotations
 
-import asyncio
-import json
 import os
 from typing import Any, Mapping, Sequence
 
 from google import genai
 from google.genai import types
 
+from app.services.prompt_context import PromptContext, build_answer_instructions
+
 DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_EMBEDDING_MODEL = "gemini-embedding-001"
+EMBEDDING_DIMENSIONS = 768
+
+_ANSWER_INSTRUCTIONS = build_answer_instructions(
+    (
+        "To find a specific month, look for keys starting with the prefix YYYYMM "
+        "(for example '202502' = February 2025)",
+    )
+)
 
 
 class GeminiService:
@@ -40,187 +49,97 @@ class GeminiService:
         """
         Generate a response using Gemini with the provided metrics context.
         """
-
-        def _call() -> str:
-            # Build config without thinking_config to avoid validation errors
-            # Thinking is enabled by default in Gemini 2.5 Flash/Pro models
-            config = types.GenerateContentConfig(
-                system_instruction=system_instruction
-                or (
-                    "You are a data analyst and operations expert for a port operations team. "
-                    "Answer in Hebrew, using the data provided in the JSON context and any knowledge base excerpts. "
-                    "\n\n"
-                    "WRITING STYLE GUIDELINES:\n"
-                    "- Keep answers concise and focused - maximum 3-4 short paragraphs\n"
-                    "- Use bullet points (•) sparingly, only for key information\n"
-                    "- Start with a direct answer to the question\n"
-                    "- Use clear, simple language - avoid unnecessary technical jargon\n"
-                    "- For regulatory/operational questions: summarize main points, don't list every detail\n"
-                    "- Highlight the most important information first\n"
-                    "- Use bold (**text**) only for critical information\n"
-                    "\n"
-                    "IMPORTANT: If the question asks about dates, months, or time periods, "
-                    "you MUST interpret and extract them from the question text, even if they "
-                    "are written in Hebrew or with typos. For example:\n"
-                    "- 'כמה מכולות נפרקו בפברואר 25' means 'how many containers were unloaded in February 2025'\n"
-                    "- 'כמה מכולות בפבאור 25' means February 2025 (פבאור is a typo for פברואר)\n"
-                    "- Hebrew month names: ינואר=January, פברואר=February, מרץ=March, אפריל=April, "
-                    "מאי=May, יוני=June, יולי=July, אוגוסט=August, ספטמבר=September, "
-                    "אוקטובר=October, נובמבר=November, דצמבר=December\n"
-                    "- Years: '25' means 2025, '24' means 2024, etc.\n"
-                    "\n"
-                    "When answering questions about containers or vehicles:\n"
-                    "- Look for date ranges in the 'period' field of the metrics\n"
-                    "- Count containers from 'containers.daily_counts' or calculate from 'containers.total_records'\n"
-                    "- For monthly queries, sum all containers in that month from 'containers.daily_counts'\n"
-                    "- Always provide specific numbers when available\n"
-                    "- IMPORTANT: The database contains only general container counts and basic metadata (dates, line codes, operation types).\n"
-                    "  It does NOT contain information about specific cargo types (e.g., metals, chemicals, food, etc.).\n"
-                    "  If asked about specific cargo types, clearly state that this information is not available in the database.\n"
-                    "  Do NOT guess or provide information from knowledge base excerpts that are not directly relevant to the question.\n"
-                    "\n"
-                    "For operational questions (e.g., procedures, regulations, port operations, job requirements):\n"
-                    "- Use information from knowledge base excerpts ONLY if they are directly relevant to the question\n"
-                    "- If knowledge base excerpts are provided but NOT relevant to the question, do NOT cite them\n"
-                    "- If no relevant excerpts are provided, you MUST use your general knowledge about:\n"
-                    "  * Port operations and maritime industry standards\n"
-                    "  * Israeli port regulations and procedures\n"
-                    "  * Common operational requirements and best practices\n"
-                    "- Be specific and practical in your answers\n"
-                    "- DO NOT say 'no information available' - instead provide an answer based on general knowledge\n"
-                    "- You can mention that the answer is based on general knowledge, but still provide the information\n"
-                    "- IMPORTANT: When citing sources, only cite knowledge base excerpts that are actually relevant to the question.\n"
-                    "  If the question is about cargo types (metals, chemicals, etc.) and the excerpts are about different topics,\n"
-                    "  do NOT cite them. Instead, clearly state that the specific information is not available in the database.\n"
-                    "\n"
-                    "If the context lacks information required to answer accurately:\n"
-                    "- State clearly what is missing instead of guessing\n"
-                    "- If the information is not available in the provided knowledge base excerpts or database,\n"
-                    "  suggest that the user check the NotebookLM knowledge base at:\n"
-                    "  https://notebooklm.google.com/notebook/66688b34-ca77-4097-8ac8-42ca8285681f\n"
-                    "- Format the suggestion as: 'למידע נוסף, אנא בדוק ב-NotebookLM: [קישור]'"
-                ),
-                temperature=0.3,
-            )
-            prompt = self._build_prompt(
+        # Build config without thinking_config to avoid validation errors
+        # Thinking is enabled by default in Gemini 2.5 Flash/Pro models
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction
+            or (
+                "You are a data analyst and operations expert for a port operations team. "
+                "Answer in Hebrew, using the data provided in the JSON context and any knowledge base excerpts. "
+                "\n\n"
+                "WRITING STYLE GUIDELINES:\n"
+                "- Keep answers concise and focused - maximum 3-4 short paragraphs\n"
+                "- Use bullet points (•) sparingly, only for key information\n"
+                "- Start with a direct answer to the question\n"
+                "- Use clear, simple language - avoid unnecessary technical jargon\n"
+                "- For regulatory/operational questions: summarize main points, don't list every detail\n"
+                "- Highlight the most important information first\n"
+                "- Use bold (**text**) only for critical information\n"
+                "\n"
+                "IMPORTANT: If the question asks about dates, months, or time periods, "
+                "you MUST interpret and extract them from the question text, even if they "
+                "are written in Hebrew or with typos. For example:\n"
+                "- 'כמה מכולות נפרקו בפברואר 25' means 'how many containers were unloaded in February 2025'\n"
+                "- 'כמה מכולות בפבאור 25' means February 2025 (פבאור is a typo for פברואר)\n"
+                "- Hebrew month names: ינואר=January, פברואר=February, מרץ=March, אפריל=April, "
+                "מאי=May, יוני=June, יולי=July, אוגוסט=August, ספטמבר=September, "
+                "אוקטובר=October, נובמבר=November, דצמבר=December\n"
+                "- Years: '25' means 2025, '24' means 2024, etc.\n"
+                "\n"
+                "When answering questions about containers or vehicles:\n"
+                "- Look for date ranges in the 'period' field of the metrics\n"
+                "- Count containers from 'containers.daily_counts' or calculate from 'containers.total_records'\n"
+                "- For monthly queries, sum all containers in that month from 'containers.daily_counts'\n"
+                "- Always provide specific numbers when available\n"
+                "- IMPORTANT: The database contains only general container counts and basic metadata (dates, line codes, operation types).\n"
+                "  It does NOT contain information about specific cargo types (e.g., metals, chemicals, food, etc.).\n"
+                "  If asked about specific cargo types, clearly state that this information is not available in the database.\n"
+                "  Do NOT guess or provide information from knowledge base excerpts that are not directly relevant to the question.\n"
+                "\n"
+                "For operational questions (e.g., procedures, regulations, port operations, job requirements):\n"
+                "- Use information from knowledge base excerpts ONLY if they are directly relevant to the question\n"
+                "- If knowledge base excerpts are provided but NOT relevant to the question, do NOT cite them\n"
+                "- If no relevant excerpts are provided, you MUST use your general knowledge about:\n"
+                "  * Port operations and maritime industry standards\n"
+                "  * Israeli port regulations and procedures\n"
+                "  * Common operational requirements and best practices\n"
+                "- Be specific and practical in your answers\n"
+                "- DO NOT say 'no information available' - instead provide an answer based on general knowledge\n"
+                "- You can mention that the answer is based on general knowledge, but still provide the information\n"
+                "- IMPORTANT: When citing sources, only cite knowledge base excerpts that are actually relevant to the question.\n"
+                "  If the question is about cargo types (metals, chemicals, etc.) and the excerpts are about different topics,\n"
+                "  do NOT cite them. Instead, clearly state that the specific information is not available in the database.\n"
+                "\n"
+                "If the context lacks information required to answer accurately:\n"
+                "- State clearly what is missing instead of guessing\n"
+                "- If the information is not available in the provided knowledge base excerpts or database,\n"
+                "  suggest that the user check the NotebookLM knowledge base at:\n"
+                "  https://notebooklm.google.com/notebook/66688b34-ca77-4097-8ac8-42ca8285681f\n"
+                "- Format the suggestion as: 'למידע נוסף, אנא בדוק ב-NotebookLM: [קישור]'"
+            ),
+            temperature=0.3,
+        )
+        prompt = self._build_prompt(
+            PromptContext(
                 question=question,
                 metrics=metrics,
                 knowledge_sections=knowledge_sections,
                 conversation_history=conversation_history,
             )
-            response = self._client.models.generate_content(
-                model=self._model,
-                contents=prompt,
-                config=config,
-            )
-            return (response.text or "").strip()
-
-        return await asyncio.to_thread(_call)
+        )
+        # Native async client: no worker thread per call
+        response = await self._client.aio.models.generate_content(
+            model=self._model,
+            contents=prompt,
+            config=config,
+        )
+        return (response.text or "").strip()
 
-    @staticmethod
-    def _build_prompt(
-        *,
-        question: str,
-        metrics: Mapping[str, Any],
-        knowledge_sections: Sequence[Mapping[str, str]] | None = None,
-        conversation_history: Sequence[Mapping[str, Any]] | None = None,
-    ) -> str:
-        context = json.dumps(metrics, ensure_ascii=False, indent=2)
-        parts = [
-            "Contextual data (JSON):",
-            context,
-        ]
-        
-        # Add conversation history if available
-        if conversation_history:
-            parts.append("\nPrevious conversation context:")
-            for idx, hist_item in enumerate(conversation_history, start=1):
-                user_q = hist_item.get("user_text", "")
-                bot_a = hist_item.get("response_text", "")
-                if user_q or bot_a:
-                    parts.append(f"\n[Previous exchange {idx}]:")
-                    if user_q:
-                        parts.append(f"User: {user_q}")
-                    if bot_a:
-                        # Truncate long responses to avoid token limits
-                        truncated = bot_a[:200] + "..." if len(bot_a) > 200 else bot_a
-                        parts.append(f"Bot: {truncated}")
-            parts.append("\n---")
-        if knowledge_sections:
-            parts.append("Relevant knowledge base excerpts:")
-            for index, section in enumerate(knowledge_sections, start=1):
-                # Support both hazard documents (document_title/document_id) and topic knowledge (topic)
-                title = (
-                    section.get("document_title")
-                    or section.get("topic")
-                    or section.get("document_id")
-                    or f"Section {index}"
-                )
-                source = section.get("source_file", "document")
-                excerpt = section.get("excerpt", "").strip()
-                identifier = section.get("section_id", f"{index}")
-                if not excerpt:
-                    continue
-                parts.append(
-                    f"[{index}] {title} ({source}, id={identifier}):\n{excerpt}"
-                )
-        else:
-            parts.append("IMPORTANT: No specific knowledge base excerpts were found for this question.")
-            parts.append("This means either:")
-            parts.append("1. The relevant document is not in the knowledge base yet")
-            parts.append("2. The search did not find matching content")
-            parts.append("")
-            parts.append("Before answering with general knowledge, check if the question mentions specific documents, regulations, or procedures that might exist in the knowledge base.")
-            parts.append("If the question is about Israeli port operations, regulations, or procedures, there may be official documents that should be consulted.")
-            parts.append("")
-            parts.append("You should still provide an answer using your general knowledge, but mention that specific documents (like 'נוהל התור התפעולי' or 'רשות הספנות והנמלים') might contain more accurate information.")
-        
-        parts.append("Question:")
-        parts.append(question)
-        parts.append("\n")
-        parts.append("Instructions:")
-        parts.append("- Answer the question based on the context provided above (metrics data)")
-        parts.append("- If the question is about operational procedures, regulations, port operations, or job requirements:")
-        parts.append("  * FIRST: Check if knowledge base excerpts are available - if yes, use them as the primary source")
-        parts.append("  * If no excerpts are available, check if the question mentions specific documents (e.g., 'נוהל התור התפעולי', 'רשות הספנות והנמלים')")
-        parts.append("  * If specific documents are mentioned but not found in excerpts, mention that these documents should be added to the knowledge base for accurate answers")
-        parts.append("  * Then use your general knowledge about port operations, maritime industry, and Israeli port regulations")
-        parts.append("  * Provide a helpful, accurate answer based on standard industry practices")
-        parts.append("- For questions about data (containers, vehicles, dates): use only the metrics data provided")
-        parts.append("- Always provide a clear, helpful answer in Hebrew")
-        parts.append("- If you're using general knowledge (not from the provided data), mention it, but still provide the answer")
-        parts.append(
-            "\n"
-            "CRITICAL INSTRUCTIONS:\n"
-            "\n"
-            "WRITING STYLE - Keep your answer concise and clear:\n"
-            "- Maximum 3-4 short paragraphs\n"
-            "- Start with a direct, clear answer\n"
-            "- Use bullet points only for key information (max 3-4 bullets)\n"
-            "- Summarize main points, don't list every detail\n"
-            "- Use simple, professional language\n"
-            "\n"
-            "1. DATE INTERPRETATION:\n"
-            "   - Extract month names and years from the question, even with typos\n"
-            "   - Hebrew months: ינואר=01, פברואר=02, מרץ=03, אפריל=04, מאי=05, יוני=06, "
-            "יולי=07, אוגוסט=08, ספטמבר=09, אוקטובר=10, נובמבר=11, דצמבר=12\n"
-            "   - Common typos: 'פבאור' or 'פבואר' = פברואר (February)\n"
-            "   - Years: '25' = 2025, '24' = 2024, etc.\n"
-            "\n"
-            "2. DATA FORMAT:\n"
-            "   - Dates in 'containers.daily_counts' are in YYYYMMDD format (e.g., '20250215' = Feb 15, 2025)\n"
-            "   - To find a specific month, look for keys starting with the prefix YYYYMM (for example '202502' = February 2025)\n"
-            "\n"
-            "3. CALCULATION:\n"
-            "   - For monthly queries: Sum ALL values in 'containers.daily_counts' where the key starts with YYYYMM\n"
-            "   - Example: For February 2025, sum all values where key starts with '202502'\n"
-            "   - For date range queries: Sum values for all dates in that range\n"
-            "\n"
-            "4. RESPONSE FORMAT:\n"
-            "   - Always provide the exact number found\n"
-            "   - Answer in Hebrew\n"
-            "   - Format: 'בחודש [חודש] [שנה] נפרקו [מספר] מכולות'\n"
-            "   - If data not found, explain what you searched for (e.g., 'חיפשתי מכולות בפברואר 2025 אך לא מצאתי נתונים')"
+    async def embed(self, text: str) -> list[float]:
+        """
+        Return an EMBEDDING_DIMENSIONS-long semantic-similarity embedding of `text`.
+        """
+        response = await self._client.aio.models.embed_content(
+            model=DEFAULT_EMBEDDING_MODEL,
+            contents=text,
+            config=types.EmbedContentConfig(
+                task_type="SEMANTIC_SIMILARITY",
+                output_dimensionality=EMBEDDING_DIMENSIONS,
+            ),
         )
-        return "\n\n".join(parts)
+        return list(response.embeddings[0].values)
 
+    @staticmethod
+    def _build_prompt(context: PromptContext) -> str:
+        """Build the prompt from the shared, lazily rendered question context."""
+        return context.render(_ANSWER_INSTRUCTIONS)
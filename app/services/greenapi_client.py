@@ -36,7 +36,18 @@ class GreenAPIClient:
         self.instance_id = instance_id
         self.api_token = api_token
         self.base_url = base_url.rstrip("/")
-        self._client = httpx.AsyncClient(timeout=timeout)
+        self._send_message_url = (
+            f"{self.base_url}/waInstance{self.instance_id}/sendMessage/{self.api_token}"
+        )
+        # Shared for every send so the TLS connection to Green API is reused;
+        # HTTP/2 lets concurrent sends multiplex over it. Waiting for a pooled
+        # connection is not bounded: a burst of send jobs (already capped by
+        # the app scheduler) should queue here, not fail with PoolTimeout.
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, pool=None),
+            http2=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
 
     async def close(self) -> None:
         await self._client.aclose()
@@ -45,15 +56,14 @@ class GreenAPIClient:
         """
         Send a standard text message to a WhatsApp chat via Green API.
         """
-        endpoint = (
-            f"{self.base_url}/waInstance{self.instance_id}/sendMessage/{self.api_token}"
-        )
+        endpoint = self._send_message_url
         payload = {
             "chatId": chat_id,
             "message": text,
         }
 
-        logger.info("Sending message to chat %s via Green API endpoint: %s", chat_id, endpoint)
+        # The endpoint URL embeds the API token, so it is never logged
+        logger.debug("Sending message to chat %s via Green API", chat_id)
         logger.debug("Message payload: %s", payload)
         try:
             response = await self._client.post(endpoint, json=payload)
@@ -78,7 +88,7 @@ class GreenAPIClient:
             
             response.raise_for_status()
             result = response.json()
-            logger.info("Message sent successfully to chat %s. Response: %s", chat_id, result)
+            logger.debug("Green API send response for chat %s: %s", chat_id, result)
             return result
         except httpx.HTTPStatusError as exc:
             error_details = "unknown"
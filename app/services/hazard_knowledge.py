@@ -16,6 +16,7 @@ logger = logging.getLogger(__name__)
 DEFAULT_DATA_PATH = (
     Path(__file__).resolve().parent.parent / "data" / "hazard" / "hazard_documents.json"
 )
+_TOKEN_PATTERN = re.compile(r"[A-Za-z\u0590-\u05FF0-9]+")
 
 
 @dataclass(frozen=True, slots=True)
@@ -140,8 +141,8 @@ class HazardKnowledgeBase:
 
     @staticmethod
     def _tokenize(text: str) -> list[str]:
-        pattern = r"[A-Za-z\u0590-\u05FF0-9]+"
-        return [token for token in re.findall(pattern, text.lower()) if token]
+        # The pattern only matches non-empty runs, so no empty tokens to filter
+        return _TOKEN_PATTERN.findall(text.lower())
 
     @staticmethod
     def _score_section(section: HazardSection, tokens: Iterable[str]) -> float:
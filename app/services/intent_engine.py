@@ -6,8 +6,15 @@ from __future__ import annotations
 
 import dataclasses
 import datetime as dt
+import logging
 import re
 from collections.abc import Mapping
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Shared read-only parameters for messages without an intent
+NO_PARAMETERS: Mapping[str, object] = MappingProxyType({})
 
 DATE_PATTERN = re.compile(
     r"(?P<day>\d{1,2})[./-](?P<month>\d{1,2})[./-](?P<year>\d{2,4})"
@@ -19,6 +26,29 @@ DATE_PATTERN_INLINE = r"\d{1,2}[./-]\d{1,2}[./-]\d{2,4}"
 class IntentResult:
     name: str
     parameters: Mapping[str, object]
+    # Typed views of the common parameters, filled from `parameters` so
+    # handlers can use attribute access instead of repeated dict lookups.
+    start_date: dt.date | None = None
+    end_date: dt.date | None = None
+    target_date: dt.date | None = None
+    month: int | None = None
+    year: int | None = None
+    container_id: str | None = None
+    question: str | None = None
+
+    def __post_init__(self) -> None:
+        # Results are shared between requests (see the webhook's match cache),
+        # so expose the parameters read-only instead of copying them per use.
+        params = self.parameters
+        if not isinstance(params, MappingProxyType):
+            params = self.parameters = MappingProxyType(params)
+        self.start_date = params.get("start_date")
+        self.end_date = params.get("end_date")
+        self.target_date = params.get("target_date")
+        self.month = params.get("month")
+        self.year = params.get("year")
+        self.container_id = params.get("container_id")
+        self.question = params.get("question")
 
 
 class IntentEngine:
@@ -140,6 +170,9 @@ class IntentEngine:
     )
 
     CONTAINER_ID_PATTERN = re.compile(r"\b([A-Z]{4}\d{7}|\d{9,12})\b", re.IGNORECASE)
+    # Ashdod status links carry the id as a query parameter; matches what follows
+    # "mismhola=" up to 12 characters, stopping at whitespace or the next parameter.
+    MISMHOLA_PATTERN = re.compile(r"mismhola=([^\s&]{0,12})", re.IGNORECASE)
 
     MANAGER_QUESTION_PATTERNS = (
         re.compile(r"אני\s+מנהל", re.IGNORECASE),
@@ -166,9 +199,6 @@ class IntentEngine:
     )
 
     def match(self, text: str) -> IntentResult | None:
-        import logging
-        logger = logging.getLogger(__name__)
-        
         stripped = text.strip()
         if not stripped:
             return None
@@ -427,11 +457,9 @@ class IntentEngine:
         if match:
             candidate = match.group(1).upper()
             return candidate
-        mis_idx = text.lower().find("mismhola=")
-        if mis_idx != -1:
-            candidate = text[mis_idx + len("mismhola=") : mis_idx + len("mismhola=") + 12]
-            candidate = re.split(r"\s|&", candidate)[0]
-            return candidate.upper()
+        match = self.MISMHOLA_PATTERN.search(text)
+        if match:
+            return match.group(1).upper()
         return None
 
     @staticmethod
@@ -0,0 +1,171 @@
+"""
+Per-question prompt context shared by the Council and Gemini clients.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Any, Mapping, Sequence
+
+import orjson
+
+HISTORY_ANSWER_PREVIEW_CHARS = 200
+
+_NO_KNOWLEDGE_NOTE = "\n\n".join(
+    (
+        "IMPORTANT: No specific knowledge base excerpts were found for this question.",
+        "This means either:",
+        "1. The relevant document is not in the knowledge base yet",
+        "2. The search did not find matching content",
+        "",
+        "Before answering with general knowledge, check if the question mentions specific documents, regulations, or procedures that might exist in the knowledge base.",
+        "If the question is about Israeli port operations, regulations, or procedures, there may be official documents that should be consulted.",
+        "",
+        "You should still provide an answer using your general knowledge, but mention that specific documents (like 'נוהל התור התפעולי' or 'רשות הספנות והנמלים') might contain more accurate information.",
+    )
+)
+
+
+# Answer instructions are shared by every client; only the "2. DATA FORMAT"
+# hints on finding a month differ, so those are filled in per client.
+_CRITICAL_INSTRUCTIONS_HEAD = (
+    "\n"
+    "CRITICAL INSTRUCTIONS:\n"
+    "\n"
+    "WRITING STYLE - Keep your answer concise and clear:\n"
+    "- Maximum 3-4 short paragraphs\n"
+    "- Start with a direct, clear answer\n"
+    "- Use bullet points only for key information (max 3-4 bullets)\n"
+    "- Summarize main points, don't list every detail\n"
+    "- Use simple, professional language\n"
+    "\n"
+    "1. DATE INTERPRETATION:\n"
+    "   - Extract month names and years from the question, even with typos\n"
+    "   - Hebrew months: ינואר=01, פברואר=02, מרץ=03, אפריל=04, מאי=05, יוני=06, "
+    "יולי=07, אוגוסט=08, ספטמבר=09, אוקטובר=10, נובמבר=11, דצמבר=12\n"
+    "   - Common typos: 'פבאור' or 'פבואר' = פברואר (February)\n"
+    "   - Years: '25' = 2025, '24' = 2024, etc.\n"
+    "\n"
+    "2. DATA FORMAT:\n"
+    "   - Dates in 'containers.daily_counts' are in YYYYMMDD format (e.g., '20250215' = Feb 15, 2025)\n"
+)
+
+_CRITICAL_INSTRUCTIONS_TAIL = (
+    "\n"
+    "3. CALCULATION:\n"
+    "   - For monthly queries: Sum ALL values in 'containers.daily_counts' where the key starts with YYYYMM\n"
+    "   - Example: For February 2025, sum all values where key starts with '202502'\n"
+    "   - For date range queries: Sum values for all dates in that range\n"
+    "\n"
+    "4. RESPONSE FORMAT:\n"
+    "   - Always provide the exact number found\n"
+    "   - Answer in Hebrew\n"
+    "   - Format: 'בחודש [חודש] [שנה] נפרקו [מספר] מכולות'\n"
+    "   - If data not found, explain what you searched for (e.g., 'חיפשתי מכולות בפברואר 2025 אך לא מצאתי נתונים')"
+)
+
+_ANSWER_GUIDELINES = (
+    "Instructions:",
+    "- Answer the question based on the context provided above (metrics data)",
+    "- If the question is about operational procedures, regulations, port operations, or job requirements:",
+    "  * FIRST: Check if knowledge base excerpts are available - if yes, use them as the primary source",
+    "  * If no excerpts are available, check if the question mentions specific documents (e.g., 'נוהל התור התפעולי', 'רשות הספנות והנמלים')",
+    "  * If specific documents are mentioned but not found in excerpts, mention that these documents should be added to the knowledge base for accurate answers",
+    "  * Then use your general knowledge about port operations, maritime industry, and Israeli port regulations",
+    "  * Provide a helpful, accurate answer based on standard industry practices",
+    "- For questions about data (containers, vehicles, dates): use only the metrics data provided",
+    "- Always provide a clear, helpful answer in Hebrew",
+    "- If you're using general knowledge (not from the provided data), mention it, but still provide the answer",
+)
+
+
+def build_answer_instructions(data_format_lines: Sequence[str]) -> str:
+    """
+    Return the answer instructions that end every prompt.
+
+    `data_format_lines` are the client's extra "2. DATA FORMAT" bullets on
+    finding a month in the daily counts. Clients call this once at import.
+    """
+    data_format = "".join(f"   - {line}\n" for line in data_format_lines)
+    critical = _CRITICAL_INSTRUCTIONS_HEAD + data_format + _CRITICAL_INSTRUCTIONS_TAIL
+    return "\n\n".join((*_ANSWER_GUIDELINES, critical))
+
+
+@lru_cache(maxsize=4096)
+def _render_history_exchange(user_text: str, response_text: str) -> str:
+    # History rows repeat across a user's next few turns, so each is rendered once
+    lines = []
+    if user_text:
+        lines.append(f"User: {user_text}")
+    if response_text:
+        # Truncate long responses to avoid token limits
+        if len(response_text) > HISTORY_ANSWER_PREVIEW_CHARS:
+            response_text = response_text[:HISTORY_ANSWER_PREVIEW_CHARS] + "..."
+        lines.append(f"Bot: {response_text}")
+    return "\n\n".join(lines)
+
+
+@dataclass
+class PromptContext:
+    """
+    The question and its context, with each prompt block rendered on first use.
+
+    Blocks are cached on the instance, so a prompt built for several models
+    (or by a second LLM client) does not serialize the same data again.
+    """
+
+    question: str
+    metrics: Mapping[str, Any]
+    knowledge_sections: Sequence[Mapping[str, str]] | None = None
+    conversation_history: Sequence[Mapping[str, Any]] | None = None
+
+    @cached_property
+    def context_json(self) -> str:
+        # Compact: the prompt may be sent to several models, so indentation costs tokens each time
+        return orjson.dumps(self.metrics, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @cached_property
+    def history_block(self) -> str:
+        """Previous exchanges as one block; empty when there are none."""
+        if not self.conversation_history:
+            return ""
+        parts = ["\nPrevious conversation context:"]
+        for idx, hist_item in enumerate(self.conversation_history, start=1):
+            exchange = _render_history_exchange(
+                hist_item.get("user_text") or "", hist_item.get("response_text") or ""
+            )
+            if exchange:
+                parts.append(f"\n[Previous exchange {idx}]:\n\n{exchange}")
+        parts.append("\n---")
+        return "\n\n".join(parts)
+
+    @cached_property
+    def knowledge_block(self) -> str:
+        """Knowledge base excerpts, or a note telling the model none were found."""
+        if not self.knowledge_sections:
+            return _NO_KNOWLEDGE_NOTE
+        parts = ["Relevant knowledge base excerpts:"]
+        for index, section in enumerate(self.knowledge_sections, start=1):
+            # Support both hazard documents (document_title/document_id) and topic knowledge (topic)
+            title = (
+                section.get("document_title")
+                or section.get("topic")
+                or section.get("document_id")
+                or f"Section {index}"
+            )
+            source = section.get("source_file", "document")
+            excerpt = section.get("excerpt", "").strip()
+            identifier = section.get("section_id", f"{index}")
+            if not excerpt:
+                continue
+            parts.append(f"[{index}] {title} ({source}, id={identifier}):\n{excerpt}")
+        return "\n\n".join(parts)
+
+    def render(self, instructions: str) -> str:
+        """Assemble the full prompt, ending with the caller's answer instructions."""
+        parts = ["Contextual data (JSON):", self.context_json]
+        if self.history_block:
+            parts.append(self.history_block)
+        parts.extend((self.knowledge_block, "Question:", self.question, "\n", instructions))
+        return "\n\n".join(parts)
@@ -0,0 +1,102 @@
+"""
+Background writer that batches bot query-log rows into Supabase.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Mapping
+
+from app.services.supabase_client import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_WAIT_SECONDS = 0.2
+MAX_QUEUED_ROWS = 5000
+
+
+class QueryLogWriter:
+    """
+    Collects query-log rows in memory and inserts them in batches.
+
+    A batch is flushed once it has BATCH_SIZE rows or MAX_WAIT_SECONDS after
+    its first row, whichever happens first. When the queue is full new rows
+    are dropped with a warning so logging never holds up a reply.
+    """
+
+    def __init__(self, supabase_service: SupabaseService) -> None:
+        self._supabase = supabase_service
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=MAX_QUEUED_ROWS)
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="query-log-writer")
+
+    def log_query(
+        self,
+        *,
+        user_phone: str,
+        user_text: str,
+        intent: str,
+        parameters: Mapping[str, Any],
+        response_text: str,
+    ) -> None:
+        """Queue one interaction for insertion."""
+        row = SupabaseService.build_query_log_row(
+            user_phone=user_phone,
+            user_text=user_text,
+            intent=intent,
+            parameters=parameters,
+            response_text=response_text,
+        )
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.warning("Query log queue is full; dropping log entry for %s", user_phone)
+
+    async def close(self) -> None:
+        """Stop the writer and flush whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        rows: list[dict[str, Any]] = []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        if rows:
+            await self._flush(rows)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: list[dict[str, Any]] = []
+        try:
+            while True:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + MAX_WAIT_SECONDS
+                while len(batch) < BATCH_SIZE:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                rows, batch = batch, []
+                await self._flush(rows)
+        finally:
+            # Rows already taken off the queue when the writer was stopped
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, rows: list[dict[str, Any]]) -> None:
+        try:
+            await asyncio.to_thread(self._supabase.log_queries, rows)
+        except Exception as e:
+            logger.error("Failed to flush %d query log rows: %s", len(rows), e, exc_info=True)
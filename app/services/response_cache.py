@@ -0,0 +1,99 @@
+"""
+Cache for free-text LLM answers, keyed by chat and the normalized question.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+
+from app.constants import VERSION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_LOCAL_ENTRIES = 1024
+KEY_PREFIX = "llm-answer:"
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class ResponseCache:
+    """
+    Stores LLM answers for repeated questions from the same chat.
+
+    Answers are conditioned on the asking chat's conversation history, so
+    entries are never shared between chats.
+
+    Uses Redis when a URL is configured (shared across workers), otherwise a
+    small in-process LRU. Every backend error is logged and treated as a miss
+    so an outage only costs the LLM call we would have made anyway.
+    """
+
+    def __init__(
+        self,
+        redis_url: str | None = None,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_local_entries: int = DEFAULT_MAX_LOCAL_ENTRIES,
+    ) -> None:
+        self._ttl = ttl_seconds
+        self._max_local = max_local_entries
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._redis = None
+        if redis_url:
+            from redis import asyncio as redis_asyncio
+
+            self._redis = redis_asyncio.Redis.from_url(
+                redis_url,
+                max_connections=10,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5,
+                decode_responses=True,
+            )
+
+    @staticmethod
+    def make_key(chat_id: str, question: str) -> str:
+        # VERSION changes on deploy, which is also when the knowledge files change.
+        digest = hashlib.sha256(f"{chat_id}|{_normalize(question)}|{VERSION}".encode("utf-8"))
+        return KEY_PREFIX + digest.hexdigest()
+
+    async def get(self, chat_id: str, question: str) -> str | None:
+        key = self.make_key(chat_id, question)
+        if self._redis is not None:
+            try:
+                return await self._redis.get(key)
+            except Exception as e:
+                logger.warning("Response cache read failed, skipping cache: %s", e)
+                return None
+
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    async def set(self, chat_id: str, question: str, answer: str) -> None:
+        key = self.make_key(chat_id, question)
+        if self._redis is not None:
+            try:
+                await self._redis.setex(key, self._ttl, answer)
+            except Exception as e:
+                logger.warning("Response cache write failed: %s", e)
+            return
+
+        self._local[key] = (time.monotonic() + self._ttl, answer)
+        self._local.move_to_end(key)
+        while len(self._local) > self._max_local:
+            self._local.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
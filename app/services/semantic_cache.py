@@ -0,0 +1,74 @@
+"""
+Similarity-based cache for LLM answers, backed by a pgvector table in Supabase.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+
+from app.services.gemini_client import GeminiService
+from app.services.supabase_client import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIMILARITY = 0.93
+
+
+@dataclasses.dataclass(slots=True)
+class SemanticLookup:
+    """Result of a cache lookup; keeps the embedding so a miss can be stored without re-embedding."""
+
+    scope: str
+    question: str
+    embedding: list[float] | None
+    answer: str | None = None
+
+
+class SemanticCache:
+    """
+    Returns a stored LLM answer when a new question is close enough in meaning
+    to one answered before within the same scope (intent plus date bucket, and
+    the chat for answers that depend on its history).
+
+    Requires sql/create_llm_cache_table.sql. Embedding or Supabase failures
+    are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        supabase_service: SupabaseService,
+        gemini_service: GeminiService,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    ) -> None:
+        self._supabase = supabase_service
+        self._gemini = gemini_service
+        self._min_similarity = min_similarity
+
+    async def lookup(self, question: str, scope: str) -> SemanticLookup:
+        try:
+            embedding = await self._gemini.embed(question)
+        except Exception as e:
+            logger.warning("Semantic cache embedding failed, skipping cache: %s", e)
+            return SemanticLookup(scope=scope, question=question, embedding=None)
+
+        answer = await asyncio.to_thread(
+            self._supabase.match_llm_cache,
+            embedding=embedding,
+            scope=scope,
+            min_similarity=self._min_similarity,
+        )
+        return SemanticLookup(scope=scope, question=question, embedding=embedding, answer=answer)
+
+    async def store(self, lookup: SemanticLookup, answer: str, ttl_seconds: int) -> None:
+        if lookup.embedding is None:
+            return
+        await asyncio.to_thread(
+            self._supabase.store_llm_cache,
+            embedding=lookup.embedding,
+            scope=lookup.scope,
+            question=lookup.question,
+            response_text=answer,
+            ttl_seconds=ttl_seconds,
+        )
@@ -6,17 +6,26 @@ from __future__ import annotations
 
 import datetime as dt
 import logging
-from typing import Any, Iterable, List, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Mapping, Sequence
 
+import base64
 import json
+import os
 import ssl
 import urllib.request
 import urllib.parse
+from urllib.parse import urlencode
 import httpx
 from supabase import Client, create_client
 
 logger = logging.getLogger(__name__)
 
+# Columns returned by get_recent_user_queries unless the caller narrows them
+RECENT_QUERY_FIELDS = ("user_text", "response_text", "intent", "created_at")
+# Worker threads for the per-month fallback when the batched count RPC is missing
+MONTHLY_FALLBACK_THREADS = 4
+
 
 class SupabaseService:
     """
@@ -54,7 +63,6 @@ class SupabaseService:
         # from reading it and causing UnicodeEncodeError
         # NOTE: Only remove SUPABASE_SCHEMA, not other SUPABASE_* variables
         # like SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY which are critical
-        import os
         
         # Remove SUPABASE_SCHEMA from environment before creating client
         # NOTE: Only remove SUPABASE_SCHEMA, not other SUPABASE_* variables
@@ -203,6 +211,28 @@ class SupabaseService:
         }
         logger.debug("Created HTTP headers with cleaned supabase_key (length: %d)", len(self._supabase_key))
         self._http_timeout = 30.0
+        # One pooled client for all PostgREST calls so TCP/TLS connections are
+        # reused across requests. httpx.Client is thread-safe, which matters
+        # because the routes call this service from worker threads.
+        self._http = httpx.Client(
+            timeout=httpx.Timeout(self._http_timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=10,
+                max_keepalive_connections=10,
+                keepalive_expiry=30 * 60,
+            ),
+        )
+        # Cleared the first time PostgREST reports container_counts_for_months
+        # missing, so later calls go straight to the per-month fallback.
+        self._monthly_rpc_available = True
+        self._monthly_fallback_pool = ThreadPoolExecutor(
+            max_workers=MONTHLY_FALLBACK_THREADS, thread_name_prefix="supabase-monthly"
+        )
+
+    def close(self) -> None:
+        """Close the pooled HTTP client and the fallback worker threads."""
+        self._http.close()
+        self._monthly_fallback_pool.shutdown(wait=False, cancel_futures=True)
 
     def _safe_table_access(self, table_name: str):
         """
@@ -213,7 +243,6 @@ class SupabaseService:
         client may have already cached it during initialization. We catch the error
         and re-create the client without SUPABASE_SCHEMA in environment.
         """
-        import os
         
         # Remove SUPABASE_SCHEMA from environment before any operation
         # This must be done before accessing the client, as the client
@@ -336,7 +365,6 @@ class SupabaseService:
             # Use PostgREST API directly via httpx to avoid schema encoding issues
             # PostgREST uses query parameters like: TARICH_PRIKA=gte.20240101&TARICH_PRIKA=lte.20240131
             # We need to use a list for multiple values with the same key
-            from urllib.parse import urlencode
             query_params = urlencode([
                 ("select", "SHANA"),
                 ("TARICH_PRIKA", f"gte.{start_str}"),
@@ -347,7 +375,6 @@ class SupabaseService:
             
             # Use httpx with explicit headers to avoid encoding issues
             # httpx doesn't read environment variables like urllib.request/http.client does
-            import os
             # Remove ALL SUPABASE_* variables except URL and KEY to be safe
             # This ensures no environment variable with non-ASCII characters
             # is read by any library
@@ -450,13 +477,11 @@ class SupabaseService:
                     
                     # Decode JWT to check role (for debugging)
                     try:
-                        import base64
                         parts = apikey_value.split('.')
                         if len(parts) >= 2:
                             payload = parts[1]
                             payload += '=' * (4 - len(payload) % 4)
                             decoded = base64.urlsafe_b64decode(payload)
-                            import json
                             payload_json = json.loads(decoded)
                             role = payload_json.get('role', 'unknown')
                             logger.info("JWT role in apikey: %s", role)
@@ -478,58 +503,57 @@ class SupabaseService:
                 
                 # Use httpx with explicit headers to avoid encoding issues
                 # httpx doesn't read environment variables during client creation
-                with httpx.Client(timeout=self._http_timeout, verify=True) as client:
-                    response = client.get(full_url, headers=safe_headers)
-                    
-                    status_code = response.status_code
-                    response_headers = dict(response.headers)
-                    response_data = response.content
-                    
-                    logger.info("Response status: %s", status_code)
-                    logger.info("Response headers: %s", response_headers)
-                    
-                    if status_code >= 400:
-                        error_msg = f"HTTP {status_code}: {response_data[:500].decode('utf-8', errors='replace')}"
-                        logger.error("HTTP error when fetching containers count: %s. Returning 0.", error_msg)
-                        return 0
-                    
-                    # Get count from Content-Range header if available
-                    content_range = response_headers.get("Content-Range", "")
-                    logger.info("Content-Range header: %s", content_range)
-                    if content_range:
-                        # Format: "0-9/100" where 100 is the total count
-                        parts = content_range.split("/")
-                        if len(parts) == 2 and parts[1].isdigit():
-                            count = int(parts[1])
-                            logger.info("Query response count from Content-Range header: %s", count)
-                            return count
-                        else:
-                            logger.warning("Content-Range header format unexpected: %s", content_range)
-                    
-                    # Fallback to counting items in response
-                    try:
-                        data = response.json()
-                        logger.info("Response data type: %s, length: %s", type(data), len(data) if isinstance(data, list) else "N/A")
-                        if isinstance(data, list):
-                            count = len(data)
-                            logger.info("Query response count from data length: %s", count)
-                            # If we got a limited result set, the count might be in Content-Range
-                            # But if Content-Range wasn't available, we return the length
-                            # NOTE: This might not be accurate if PostgREST limits results
-                            if count > 0:
-                                logger.warning(
-                                    "Got %d items in response but no Content-Range header. "
-                                    "This might be a partial result. Consider using count=exact header.",
-                                    count
-                                )
-                            return count
-                        else:
-                            logger.warning("Response data is not a list: %s", type(data))
-                            logger.warning("Response data content: %s", str(data)[:500])
-                            return 0
-                    except json.JSONDecodeError as e:
-                        logger.error("Failed to parse JSON response: %s. Response: %s", e, response_data[:500])
+                response = self._http.get(full_url, headers=safe_headers)
+                
+                status_code = response.status_code
+                response_headers = dict(response.headers)
+                response_data = response.content
+                
+                logger.info("Response status: %s", status_code)
+                logger.info("Response headers: %s", response_headers)
+                
+                if status_code >= 400:
+                    error_msg = f"HTTP {status_code}: {response_data[:500].decode('utf-8', errors='replace')}"
+                    logger.error("HTTP error when fetching containers count: %s. Returning 0.", error_msg)
+                    return 0
+                
+                # Get count from Content-Range header if available
+                content_range = response_headers.get("Content-Range", "")
+                logger.info("Content-Range header: %s", content_range)
+                if content_range:
+                    # Format: "0-9/100" where 100 is the total count
+                    parts = content_range.split("/")
+                    if len(parts) == 2 and parts[1].isdigit():
+                        count = int(parts[1])
+                        logger.info("Query response count from Content-Range header: %s", count)
+                        return count
+                    else:
+                        logger.warning("Content-Range header format unexpected: %s", content_range)
+                
+                # Fallback to counting items in response
+                try:
+                    data = response.json()
+                    logger.info("Response data type: %s, length: %s", type(data), len(data) if isinstance(data, list) else "N/A")
+                    if isinstance(data, list):
+                        count = len(data)
+                        logger.info("Query response count from data length: %s", count)
+                        # If we got a limited result set, the count might be in Content-Range
+                        # But if Content-Range wasn't available, we return the length
+                        # NOTE: This might not be accurate if PostgREST limits results
+                        if count > 0:
+                            logger.warning(
+                                "Got %d items in response but no Content-Range header. "
+                                "This might be a partial result. Consider using count=exact header.",
+                                count
+                            )
+                        return count
+                    else:
+                        logger.warning("Response data is not a list: %s", type(data))
+                        logger.warning("Response data content: %s", str(data)[:500])
                         return 0
+                except json.JSONDecodeError as e:
+                    logger.error("Failed to parse JSON response: %s. Response: %s", e, response_data[:500])
+                    return 0
             except UnicodeEncodeError as e:
                 logger.error(
                     "UnicodeEncodeError when making request: %s. "
@@ -624,6 +648,53 @@ class SupabaseService:
             )
             return 0
 
+    def get_containers_counts_monthly(
+        self, months: Sequence[tuple[int, int]]
+    ) -> dict[tuple[int, int], int]:
+        """
+        Count containers for several (month, year) pairs in one round-trip.
+
+        Uses the `container_counts_for_months` RPC (see
+        sql/create_container_counts_for_months_function.sql). If the function is
+        not installed or the call fails, falls back to one count per month, run
+        concurrently on the shared fallback threads (the shared httpx.Client is
+        thread-safe). A missing function is remembered, so the RPC is not
+        retried until restart.
+        """
+        logger.info("Fetching monthly container counts for %s", list(months))
+        if self._monthly_rpc_available:
+            try:
+                response = self._http.post(
+                    f"{self._http_base_url}/rpc/container_counts_for_months",
+                    headers=self._http_headers,
+                    json={"months": [dt.date(year, month, 1).isoformat() for month, year in months]},
+                )
+                if response.status_code == 404:
+                    self._monthly_rpc_available = False
+                    logger.warning(
+                        "container_counts_for_months RPC is not installed; using per-month "
+                        "queries (apply sql/create_container_counts_for_months_function.sql)"
+                    )
+                else:
+                    response.raise_for_status()
+                    by_month = {
+                        dt.date.fromisoformat(row["month"]): int(row["count"] or 0)
+                        for row in response.json()
+                    }
+                    return {
+                        (month, year): by_month.get(dt.date(year, month, 1), 0)
+                        for month, year in months
+                    }
+            except Exception as e:
+                logger.warning(
+                    "Batched monthly count RPC failed (%s); falling back to per-month queries",
+                    e,
+                )
+        counts = self._monthly_fallback_pool.map(
+            lambda my: self.get_containers_count_monthly(*my), months
+        )
+        return dict(zip(months, counts))
+
     def get_monthly_containers_series_last_year(self) -> list[dict[str, Any]]:
         """
         Return monthly containers count for the last 12 months.
@@ -675,8 +746,9 @@ class SupabaseService:
             "Comparing containers: month1=%d/%d vs month2=%d/%d",
             month1, year1, month2, year2
         )
-        count1 = self.get_containers_count_monthly(month1, year1)
-        count2 = self.get_containers_count_monthly(month2, year2)
+        counts = self.get_containers_counts_monthly([(month1, year1), (month2, year2)])
+        count1 = counts[(month1, year1)]
+        count2 = counts[(month2, year2)]
         difference = count2 - count1
         
         logger.info(
@@ -773,8 +845,6 @@ class SupabaseService:
             start_str = start_date.strftime("%Y%m%d")
             end_str = end_date.strftime("%Y%m%d")
             
-            from urllib.parse import urlencode
-            import os
             
             # Build query parameters
             query_params = urlencode([
@@ -836,22 +906,21 @@ class SupabaseService:
                 logger.debug("Making GET request to: %s", full_url)
                 
                 # Use httpx with explicit headers to avoid encoding issues
-                with httpx.Client(timeout=self._http_timeout, verify=True) as client:
-                    response = client.get(full_url, headers=safe_headers)
-                    
-                    if response.status_code >= 400:
-                        error_msg = f"HTTP {response.status_code}: {response.text[:500]}"
-                        logger.error("HTTP error when fetching containers: %s. Returning empty list.", error_msg)
-                        return []
-                    
-                    # Parse JSON response
-                    data = response.json()
-                    if isinstance(data, list):
-                        logger.debug("Fetched %d container records", len(data))
-                        return data
-                    else:
-                        logger.warning("Response data is not a list: %s", type(data))
-                        return []
+                response = self._http.get(full_url, headers=safe_headers)
+                
+                if response.status_code >= 400:
+                    error_msg = f"HTTP {response.status_code}: {response.text[:500]}"
+                    logger.error("HTTP error when fetching containers: %s. Returning empty list.", error_msg)
+                    return []
+                
+                # Parse JSON response
+                data = response.json()
+                if isinstance(data, list):
+                    logger.debug("Fetched %d container records", len(data))
+                    return data
+                else:
+                    logger.warning("Response data is not a list: %s", type(data))
+                    return []
             except UnicodeEncodeError as e:
                 logger.error(
                     "UnicodeEncodeError when fetching containers: %s. "
@@ -896,8 +965,6 @@ class SupabaseService:
             start_str = start_date.isoformat()
             end_str = end_date.isoformat()
             
-            from urllib.parse import urlencode
-            import os
             
             # Build query parameters
             query_params = urlencode([
@@ -959,22 +1026,21 @@ class SupabaseService:
                 logger.debug("Making GET request to: %s", full_url)
                 
                 # Use httpx with explicit headers to avoid encoding issues
-                with httpx.Client(timeout=self._http_timeout, verify=True) as client:
-                    response = client.get(full_url, headers=safe_headers)
-                    
-                    if response.status_code >= 400:
-                        error_msg = f"HTTP {response.status_code}: {response.text[:500]}"
-                        logger.error("HTTP error when fetching vehicles: %s. Returning empty list.", error_msg)
-                        return []
-                    
-                    # Parse JSON response
-                    data = response.json()
-                    if isinstance(data, list):
-                        logger.debug("Fetched %d vehicle records", len(data))
-                        return data
-                    else:
-                        logger.warning("Response data is not a list: %s", type(data))
-                        return []
+                response = self._http.get(full_url, headers=safe_headers)
+                
+                if response.status_code >= 400:
+                    error_msg = f"HTTP {response.status_code}: {response.text[:500]}"
+                    logger.error("HTTP error when fetching vehicles: %s. Returning empty list.", error_msg)
+                    return []
+                
+                # Parse JSON response
+                data = response.json()
+                if isinstance(data, list):
+                    logger.debug("Fetched %d vehicle records", len(data))
+                    return data
+                else:
+                    logger.warning("Response data is not a list: %s", type(data))
+                    return []
             except UnicodeEncodeError as e:
                 logger.error(
                     "UnicodeEncodeError when fetching vehicles: %s. "
@@ -1013,6 +1079,7 @@ class SupabaseService:
         user_phone: str,
         limit: int = 5,
         exclude_current: bool = True,
+        fields: Sequence[str] | None = None,
     ) -> list[dict[str, Any]]:
         """
         Get recent queries from a specific user for context.
@@ -1021,28 +1088,27 @@ class SupabaseService:
             user_phone: Phone number of the user
             limit: Maximum number of recent queries to return (default: 5)
             exclude_current: If True, excludes the most recent query (default: True)
+            fields: Columns to select (default: RECENT_QUERY_FIELDS); include
+                created_at to get created_ts
         
         Returns:
-            List of recent queries with user_text, response_text, intent, and created_at
+            List of recent queries with user_text, response_text, intent, created_at,
+            and created_ts (created_at as epoch seconds, None if unparseable)
         """
         try:
             # Use direct HTTP request to avoid Supabase client issues
-            url = f"{self._supabase_url}/rest/v1/bot_queries_log"
-            headers = {
-                "apikey": self._supabase_key,
-                "Authorization": f"Bearer {self._supabase_key}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation",
-            }
+            url = f"{self._http_base_url}/bot_queries_log"
             
+            # Served by idx_bot_queries_log_user_phone_created_at; only the
+            # columns the caller reads are selected.
             params = {
                 "user_phone": f"eq.{user_phone}",
                 "order": "created_at.desc",
                 "limit": str(limit + (1 if exclude_current else 0)),
-                "select": "user_text,response_text,intent,parameters,created_at",
+                "select": ",".join(fields or RECENT_QUERY_FIELDS),
             }
             
-            response = httpx.get(url, headers=headers, params=params, timeout=self._http_timeout)
+            response = self._http.get(url, headers=self._http_headers, params=params)
             response.raise_for_status()
             
             queries = response.json()
@@ -1053,6 +1119,9 @@ class SupabaseService:
             
             # Reverse to get chronological order (oldest first)
             queries.reverse()
+
+            for query in queries:
+                query["created_ts"] = _epoch_seconds(query.get("created_at"))
             
             logger.debug(
                 "Retrieved %d recent queries for user %s",
@@ -1096,7 +1165,7 @@ class SupabaseService:
                 "select": "id,user_text,response_text,intent,parameters,created_at",
             }
             
-            response = httpx.get(url, headers=headers, params=params, timeout=self._http_timeout)
+            response = self._http.get(url, headers=headers, params=params)
             response.raise_for_status()
             
             queries = response.json()
@@ -1115,38 +1184,66 @@ class SupabaseService:
         user_phone: str,
         user_text: str,
         intent: str,
-        parameters: dict[str, Any],
+        parameters: Mapping[str, Any],
         response_text: str,
     ) -> None:
         """
         Persist interactions for auditing and analytics.
         """
         logger.debug("Logging query for user %s intent %s", user_phone, intent)
+        self.log_queries(
+            [
+                self.build_query_log_row(
+                    user_phone=user_phone,
+                    user_text=user_text,
+                    intent=intent,
+                    parameters=parameters,
+                    response_text=response_text,
+                )
+            ]
+        )
+
+    @staticmethod
+    def build_query_log_row(
+        *,
+        user_phone: str,
+        user_text: str,
+        intent: str,
+        parameters: Mapping[str, Any],
+        response_text: str,
+    ) -> dict[str, Any]:
+        """
+        Build a `bot_queries_log` row with JSON-serializable parameters.
+        """
+        safe_parameters = {}
+        for key, value in parameters.items():
+            if isinstance(value, (str, int, float, bool, type(None))):
+                safe_parameters[key] = value
+            elif isinstance(value, dt.date):
+                safe_parameters[key] = value.isoformat()
+            else:
+                safe_parameters[key] = str(value)
+        return {
+            "user_phone": user_phone,
+            "user_text": user_text,
+            "intent": intent,
+            "parameters": safe_parameters,
+            "response_text": response_text,
+        }
+
+    def log_queries(self, rows: List[dict[str, Any]]) -> None:
+        """
+        Insert several `bot_queries_log` rows in a single request.
+        """
+        if not rows:
+            return
         try:
-            # Convert parameters to JSON-serializable format
-            safe_parameters = {}
-            for key, value in parameters.items():
-                if isinstance(value, (str, int, float, bool, type(None))):
-                    safe_parameters[key] = value
-                elif isinstance(value, dt.date):
-                    safe_parameters[key] = value.isoformat()
-                else:
-                    safe_parameters[key] = str(value)
-            
             # Use table without schema to avoid encoding issues
             query = self._safe_table_access("bot_queries_log")
             # Note: schema() is not supported by Supabase Python client
             # All queries use the default schema (usually 'public')
-            
-            query.insert(
-                {
-                    "user_phone": user_phone,
-                    "user_text": user_text,
-                    "intent": intent,
-                    "parameters": safe_parameters,
-                    "response_text": response_text,
-                }
-            ).execute()
+
+            query.insert(rows).execute()
         except UnicodeEncodeError as e:
             logger.error(
                 "UnicodeEncodeError when logging query: %s. "
@@ -1157,6 +1254,68 @@ class SupabaseService:
         except Exception as e:
             logger.error("Failed to log query: %s", e, exc_info=True)
 
+    def match_llm_cache(
+        self,
+        *,
+        embedding: Sequence[float],
+        scope: str,
+        min_similarity: float,
+    ) -> str | None:
+        """
+        Return the closest cached LLM answer in `scope` at or above `min_similarity`.
+
+        Uses the `match_llm_cache` RPC (see sql/create_llm_cache_table.sql).
+        Any failure is treated as a miss.
+        """
+        try:
+            response = self._http.post(
+                f"{self._http_base_url}/rpc/match_llm_cache",
+                headers=self._http_headers,
+                json={
+                    "query_embedding": list(embedding),
+                    "match_scope": scope,
+                    "min_similarity": min_similarity,
+                },
+            )
+            response.raise_for_status()
+            rows = response.json()
+        except Exception as e:
+            logger.warning("LLM cache lookup failed, skipping cache: %s", e)
+            return None
+        if not rows:
+            return None
+        logger.info("LLM cache hit for scope=%s (similarity=%.3f)", scope, rows[0]["similarity"])
+        return rows[0]["response"]
+
+    def store_llm_cache(
+        self,
+        *,
+        embedding: Sequence[float],
+        scope: str,
+        question: str,
+        response_text: str,
+        ttl_seconds: int,
+    ) -> None:
+        """
+        Insert one `llm_cache` row that expires after `ttl_seconds`.
+        """
+        expires_at = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=ttl_seconds)
+        try:
+            response = self._http.post(
+                f"{self._http_base_url}/llm_cache",
+                headers={**self._http_headers, "Prefer": "return=minimal"},
+                json={
+                    "scope": scope,
+                    "question": question,
+                    "response": response_text,
+                    "embedding": list(embedding),
+                    "expires_at": expires_at.isoformat(),
+                },
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning("Failed to store LLM cache entry: %s", e)
+
     def bulk_insert(
         self,
         *,
@@ -1172,6 +1331,20 @@ class SupabaseService:
             self._safe_table_access(table).insert(batch).execute()
 
 
+def _epoch_seconds(timestamp: str | None) -> float | None:
+    """Parse a PostgREST timestamptz string to epoch seconds (UTC if naive)."""
+    if not timestamp:
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(timestamp)
+    except ValueError:
+        logger.warning("Unparseable created_at timestamp: %s", timestamp)
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return parsed.timestamp()
+
+
 def _chunked(iterable: Iterable[dict[str, Any]], size: int) -> Iterable[List[dict[str, Any]]]:
     batch: List[dict[str, Any]] = []
     for item in iterable:
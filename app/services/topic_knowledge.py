@@ -17,6 +17,8 @@ logger = logging.getLogger(__name__)
 DEFAULT_DATA_PATH = (
     Path(__file__).resolve().parent.parent / "data" / "fwai" / "downloads"
 )
+_SEPARATOR_PATTERN = re.compile(r"[_\-\s]+")
+_TOKEN_PATTERN = re.compile(r"[A-Za-z\u0590-\u05FF0-9]+")
 
 
 @dataclass(frozen=True, slots=True)
@@ -58,11 +60,8 @@ class TopicKnowledgeBase:
         # Remove extension
         name = Path(filename).stem
         
-        # Replace common separators with spaces
-        name = re.sub(r"[_\-\s]+", " ", name)
-        
-        # Clean up multiple spaces
-        name = re.sub(r"\s+", " ", name).strip()
+        # Replace runs of separators and whitespace with a single space
+        name = _SEPARATOR_PATTERN.sub(" ", name).strip()
         
         return name if name else filename
 
@@ -379,8 +378,8 @@ class TopicKnowledgeBase:
 
     @staticmethod
     def _tokenize(text: str) -> list[str]:
-        pattern = r"[A-Za-z\u0590-\u05FF0-9]+"
-        return [token for token in re.findall(pattern, text.lower()) if token]
+        # The pattern only matches non-empty runs, so no empty tokens to filter
+        return _TOKEN_PATTERN.findall(text.lower())
 
     @staticmethod
     def _get_synonyms(token: str) -> list[str]:
@@ -9,8 +9,8 @@ CREATE TABLE IF NOT EXISTS public.bot_queries_log (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create index on user_phone for faster lookups
-CREATE INDEX IF NOT EXISTS idx_bot_queries_log_user_phone ON public.bot_queries_log(user_phone);
+-- Create index on (user_phone, created_at) for per-user history lookups
+CREATE INDEX IF NOT EXISTS idx_bot_queries_log_user_phone_created_at ON public.bot_queries_log(user_phone, created_at DESC);
 
 -- Create index on created_at for time-based queries
 CREATE INDEX IF NOT EXISTS idx_bot_queries_log_created_at ON public.bot_queries_log(created_at);
@@ -0,0 +1,9 @@
+-- Composite index backing the per-user conversation-history lookup
+-- (WHERE user_phone = ? ORDER BY created_at DESC LIMIT n), so it is an index
+-- range scan instead of a sort over all of the user's rows.
+-- CONCURRENTLY avoids locking inserts; run it outside a transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bot_queries_log_user_phone_created_at
+    ON public.bot_queries_log (user_phone, created_at DESC);
+
+-- The single-column user_phone index is a prefix of the one above.
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_bot_queries_log_user_phone;
@@ -0,0 +1,19 @@
+-- Count containers for several calendar months in a single round-trip.
+-- Called via PostgREST: POST /rest/v1/rpc/container_counts_for_months
+--   body: {"months": ["2024-01-01", "2025-01-01"]}
+-- Each element is the first day of a month; months without rows are omitted.
+CREATE OR REPLACE FUNCTION public.container_counts_for_months(months date[])
+RETURNS TABLE (month date, count bigint)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT date_trunc('month', c."TARICH_PRIKA"::date)::date AS month,
+           count(*) AS count
+    FROM public.containers c
+    WHERE c."TARICH_PRIKA"::date >= (SELECT min(m) FROM unnest(months) AS m)
+      AND c."TARICH_PRIKA"::date < (SELECT max(m) FROM unnest(months) AS m) + interval '1 month'
+      AND date_trunc('month', c."TARICH_PRIKA"::date)::date = ANY (months)
+    GROUP BY 1;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.container_counts_for_months(date[]) TO service_role;
@@ -0,0 +1,55 @@
+-- Semantic cache for LLM answers (used when SEMANTIC_CACHE_ENABLED=true).
+-- Embeddings come from gemini-embedding-001 truncated to 768 dimensions.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS public.llm_cache (
+    id BIGSERIAL PRIMARY KEY,
+    scope TEXT NOT NULL,
+    question TEXT NOT NULL,
+    response TEXT NOT NULL,
+    embedding vector(768) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_embedding
+    ON public.llm_cache USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_scope_expires_at
+    ON public.llm_cache (scope, expires_at);
+
+-- Closest unexpired answer in a scope, if at least min_similarity (cosine).
+-- Called via PostgREST: POST /rest/v1/rpc/match_llm_cache
+CREATE OR REPLACE FUNCTION public.match_llm_cache(
+    query_embedding vector(768),
+    match_scope text,
+    min_similarity double precision
+)
+RETURNS TABLE (response text, similarity double precision)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT response, similarity
+    FROM (
+        SELECT response, 1 - (embedding <=> query_embedding) AS similarity
+        FROM public.llm_cache
+        WHERE scope = match_scope
+          AND expires_at > NOW()
+        ORDER BY embedding <=> query_embedding
+        LIMIT 1
+    ) nearest
+    WHERE similarity >= min_similarity;
+$$;
+
+-- Expired rows are never matched; clear them out periodically, e.g.:
+--   DELETE FROM public.llm_cache WHERE expires_at < NOW();
+
+ALTER TABLE public.llm_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage llm_cache"
+    ON public.llm_cache
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+GRANT ALL ON public.llm_cache TO service_role;
+GRANT USAGE, SELECT ON SEQUENCE public.llm_cache_id_seq TO service_role;
+GRANT EXECUTE ON FUNCTION public.match_llm_cache(vector, text, double precision) TO service_role;